@@ -0,0 +1,170 @@
+"""
+DeviceManager.cmd 的微基准.
+对比基线版本逐个动作深拷贝、序列化、写库的 cmd 与批量实现处理 100 个动作的单动作耗时。
+在仓库根目录运行: DEBUG=True python app/bench/bench_cmd.py
+"""
+import os
+import sys
+import copy
+import json
+import time
+import sqlite3
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import core
+
+
+class _LegacyHiAI:
+    """ 基线版本 HIAI_auto 中 cmd 用到的部分 """
+    def __init__(self):
+        self._data = {}
+        self._messages = [
+            {"role": "system", "content": ""},
+            {"role": "user", "content": self._data},
+        ]
+
+    def set_data(self, data):
+        self._data = data
+        self._messages[1]["content"] = data
+
+
+class _LegacyDevice:
+    def __init__(self, data, seed=None):
+        self.data = data
+        if seed is not None:
+            self.seed = seed
+
+
+class LegacyManager:
+    """
+    批量化之前（基线提交 74f4230）的 DeviceManager.cmd 及其写库方法，仅作对照.
+    设备数据复制自当前的设备并按顺序重新编号，与基线一样 id 即为 devices 列表的下标；
+    参数写入独立的数据库，每次写入都新建连接。
+    """
+    def __init__(self, manager, db_file):
+        self.all_device_config = {
+            "status": "init",
+            "init_param": copy.deepcopy(manager.all_device_config["init_param"]),
+            "devices": []
+        }
+        self.device_instances = {}
+        self.hi_ai = _LegacyHiAI()
+        self._db_file = db_file
+        self._writting_db = False
+        conn = sqlite3.connect(self._db_file)
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE IF NOT EXISTS param (id TEXT PRIMARY KEY, param BLOB)")
+        for i, device in enumerate(manager.device_instances.values()):
+            data = copy.deepcopy(device.data)
+            data["id"] = i
+            legacy = _LegacyDevice(data, getattr(device, "seed", None))
+            self.all_device_config["devices"].append(data)
+            self.device_instances[i] = legacy
+            if hasattr(legacy, "seed"):
+                cursor.execute("INSERT OR REPLACE INTO param (id, param) VALUES (?, ?)", (legacy.seed, json.dumps(data["param"]["present"]).encode("utf-8")))
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+    def _update_param_in_db(self, db, id, value, timeout=5):
+        for i in range(timeout * 2):
+            if self._writting_db:
+                time.sleep(0.5)
+            else:
+                break
+            if i == timeout * 2 - 1:
+                return "Failure"
+        self._writting_db = True
+        conn = sqlite3.connect(self._db_file)
+        cursor = conn.cursor()
+        query = f"UPDATE {db} SET param=? WHERE id=?"
+        cursor.execute(query, (json.dumps(value).encode("utf-8"), id))
+        conn.commit()
+        cursor.close()
+        conn.close()
+        self._writting_db = False
+
+    def cmd(self, data):
+        try:
+            data_decode = json.loads(data)
+            logging.info(data_decode)
+        except json.JSONDecodeError:
+            logging.error("无法解析 JSON 数据")
+            return
+        if not "actions" in data_decode:
+            return
+        for item in data_decode["actions"]:
+            if self.device_instances[item["id"]]:
+                device_instances_present = copy.deepcopy(self.device_instances[item["id"]].data["param"]["present"])
+                all_device_config_present = copy.deepcopy(self.all_device_config["devices"][item["id"]]["param"]["present"])
+                for key, value in item["param"].items():
+                    if key in device_instances_present:
+                        expected_type = type(device_instances_present[key])
+                        try:
+                            device_instances_present[key] = expected_type(value)
+                        except (ValueError, TypeError):
+                            print(f"参数转换失败：键 '{key}'，值 '{value}' 无法转换为 {expected_type.__name__}")
+                    if key in all_device_config_present:
+                        expected_type = type(all_device_config_present[key])
+                        try:
+                            all_device_config_present[key] = expected_type(value)
+                        except (ValueError, TypeError):
+                            print(f"参数转换失败：键 '{key}'，值 '{value}' 无法转换为 {expected_type.__name__}")
+                self.device_instances[item["id"]].data["param"]["present"] = copy.deepcopy(device_instances_present)
+                self.all_device_config["devices"][item["id"]]["param"]["present"] = copy.deepcopy(all_device_config_present)
+                del device_instances_present
+                del all_device_config_present
+                self.hi_ai.set_data(json.dumps(self.all_device_config))
+                if hasattr(self.device_instances[item["id"]], "seed"):
+                    self._update_param_in_db(db="param", id=self.device_instances[item["id"]].seed, value=item["param"])
+
+
+def payload(manager, size, seq):
+    """ 轮流控制各设备，每个动作写入 present 中的全部字段，没有 selection 声明的字符串字段每次取不同的值 """
+    devices = list(manager.device_instances.values())
+    actions = []
+    for i in range(size):
+        device = devices[i % len(devices)]
+        present = device.data["param"]["present"]
+        selection = device.data["param"].get("selection", {})
+        param = {}
+        for key, value in present.items():
+            if isinstance(value, str) and key not in selection:
+                param[key] = f"{value[:8]}{seq}-{i}"
+            else:
+                param[key] = copy.deepcopy(value)
+        actions.append({"id": device.data["id"], "param": param})
+    return json.dumps({"actions": actions})
+
+
+def measure(func, manager, size, rounds):
+    payloads = [payload(manager, size, i) for i in range(rounds)]
+    start = time.perf_counter()
+    for data in payloads:
+        func(data)
+    return (time.perf_counter() - start) / (size * rounds) * 1e6
+
+
+def main(size=100, rounds=20):
+    logging.disable(logging.CRITICAL)
+    manager = core.manager
+    if not manager.device_instances:
+        print("没有可用的设备")
+        return
+    with tempfile.TemporaryDirectory() as workdir:
+        legacy_manager = LegacyManager(manager, os.path.join(workdir, "data.db"))
+        legacy = measure(legacy_manager.cmd, legacy_manager, size, rounds)
+    batched = measure(manager.cmd, manager, size, rounds)
+    print(f"devices: {len(manager.device_instances)}, actions per payload: {size}, payloads: {rounds}")
+    print(f"legacy : {legacy:8.1f} us/action")
+    print(f"batched: {batched:8.1f} us/action")
+    print(f"speedup: {legacy / batched:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
+    # 设备线程不是守护线程，直接退出
+    os._exit(0)
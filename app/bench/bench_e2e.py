@@ -0,0 +1,242 @@
+"""
+端到端基准测试.
+在临时工作目录中以模拟模式启动完整的 DeviceManager（硬件、外部服务与 LLM 均为模拟），测量：
+启动耗时、触发 → LLM → cmd() → 硬件动作各阶段的延迟分位数，以及 API 吞吐量，结果写入 JSON 报告。
+用法: python app/bench/bench_e2e.py --iterations 20 --llm-latency 0.3 --report bench_report.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import platform
+import threading
+import contextlib
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+REPO_DIR = os.path.join(APP_DIR, "..")
+sys.path.insert(0, APP_DIR)
+
+import toml
+
+from load_test import run as load_run, percentile
+
+# 语音触发的指令与期望的硬件动作目标，同一场景的指令轮流使用，保证每次都会改变设备状态
+SCENARIOS = {
+    "light": (["开灯", "关灯"], "rgb_light", "light"),
+    "draperies": (["关闭窗帘", "打开窗帘"], "draperies", "gpio:"),
+    "refrigeration": (["打开空调", "关闭空调"], "refrigeration", "serial:"),
+    "notify": (["你好", "早上好"], "notify", "audio"),
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def summarize(samples):
+    """ 样本（秒）的分位数，单位毫秒 """
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean_ms": sum(samples) / len(samples) * 1000,
+        "p50_ms": percentile(samples, 0.5) * 1000,
+        "p90_ms": percentile(samples, 0.9) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+
+
+def build_config(args, port):
+    """ 以 config.toml.example 为基础，关闭响应缓存与本地规则，使每次触发都经过 LLM """
+    with open(os.path.join(REPO_DIR, "source", "config.toml.example"), "r", encoding="utf-8") as f:
+        config = toml.load(f)
+    config["rules"] = []
+    config["cache"]["enabled"] = False
+    config["openai"]["stream"] = args.stream
+    config["http"].update(host="127.0.0.1", port=port, server="cheroot")
+    config["sim"] = dict(config.get("sim", {}), llm=True, llm_latency=args.llm_latency)
+    return config
+
+
+def wait_ready(manager, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        health = manager.readiness.health()
+        if all(device["state"] in ("ready", "failed") for device in health["devices"]):
+            return health
+        time.sleep(0.05)
+    return manager.readiness.health()
+
+
+def watch_handoff(device):
+    """ 记录 cmd() 把变化交给设备驱动的时间 """
+    handoffs = []
+    on_change = device.on_change
+
+    def wrapped(diff):
+        handoffs.append(time.time())
+        on_change(diff)
+
+    device.on_change = wrapped
+    return handoffs
+
+
+def measure_trigger(sim, speech, message, handoffs, target, timeout):
+    """
+    注入一次语音触发，等待目标硬件动作.
+    硬件动作取驱动收到变化之后目标的第一条记录；电机仍在转动时，这条记录可能是上一次转动的步进。
+    :return: 各阶段耗时（秒），超时返回 None
+    """
+    start = time.time()
+    speech._hear(message)
+    deadline = start + timeout
+    while time.time() < deadline and not (handoffs and handoffs[-1] >= start):
+        time.sleep(0.001)
+    if not (handoffs and handoffs[-1] >= start):
+        return None
+    handoff = handoffs[-1]
+    record = sim.recorder.wait(handoff, target, timeout=max(0, deadline - time.time()))
+    llm = next((entry for entry in sim.get_llm().requests if entry["received"] >= start), None)
+    if record is None or llm is None:
+        return None
+    # 流式模式下动作可能在响应结束前就已执行
+    llm_end = min(llm["completed"], handoff)
+    return {
+        "queue": llm["received"] - start,
+        "llm": llm_end - llm["received"],
+        "apply": handoff - llm_end,
+        "actuate": record["time"] - handoff,
+        "total": record["time"] - start,
+    }
+
+
+def bench_latency(core, sim, iterations, timeout):
+    manager = core.manager
+    names = {device.data["name"]: device_id for device_id, device in manager.device_instances.items()}
+    speech = manager.device_instances[names["speech_recognation"]]
+    results = {}
+    for scenario, (messages, device_name, target) in SCENARIOS.items():
+        if device_name not in names:
+            results[scenario] = {"skipped": f"{device_name} unavailable"}
+            continue
+        handoffs = watch_handoff(manager.device_instances[names[device_name]])
+        stages = {}
+        timeouts = 0
+        for i in range(iterations):
+            sample = measure_trigger(sim, speech, messages[i % len(messages)], handoffs, target, timeout)
+            if sample is None:
+                timeouts += 1
+                continue
+            for stage, seconds in sample.items():
+                stages.setdefault(stage, []).append(seconds)
+            # 等待合并窗口与上一次的硬件动作结束，使下一次触发独立
+            time.sleep(1.2)
+        results[scenario] = {"timeouts": timeouts, "stages": {stage: summarize(samples) for stage, samples in stages.items()}}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="hi-core end-to-end benchmark on simulated hardware")
+    parser.add_argument("--iterations", type=int, default=20, help="每个场景的触发次数")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="模拟 LLM 的响应时间（秒）")
+    parser.add_argument("--stream", action="store_true", help="以流式模式请求 LLM")
+    parser.add_argument("--timeout", type=float, default=10, help="单次触发等待硬件动作的最长时间（秒）")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5, help="每个接口的压测时长（秒）")
+    parser.add_argument("--report", default="bench_report.json", help="JSON 报告路径")
+    parser.add_argument("--keep", action="store_true", help="保留临时工作目录及其中的 core.log")
+    args = parser.parse_args()
+    report_path = os.path.abspath(args.report)
+
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix="hi-core-bench-")
+    os.environ.pop("DEBUG", None)
+    os.environ["HI_SIM"] = "1"
+    from modules import sim
+    sim.prepare(workdir, build_config(args, port))
+    os.chdir(workdir)
+    console = sys.stdout
+    print(f"工作目录 {workdir}，运行输出写入 core.log")
+
+    with open(os.path.join(workdir, "core.log"), "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        start = time.perf_counter()
+        import core
+        constructed = time.perf_counter() - start
+        health = wait_ready(core.manager, timeout=60)
+        ready = time.perf_counter() - start
+        startup = {
+            "construct_seconds": constructed,
+            "ready_seconds": ready,
+            "devices": health["devices"],
+            "imports": core.device_classes.import_report(),
+        }
+        print(f"启动完成 {ready:.2f}s", file=console)
+
+        latency = bench_latency(core, sim, args.iterations, args.timeout)
+        llm_usage = core.manager.hi_ai.usage_stats()
+        response_cache = core.manager.hi_ai.cache_stats()
+        print("延迟测试完成", file=console)
+
+        threading.Thread(target=core.serve, daemon=True).start()
+        url = f"http://127.0.0.1:{port}"
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                break
+            time.sleep(0.1)
+        throughput = [
+            load_run(url, core.SECRET_API_KEY, endpoint, args.concurrency, args.duration)
+            for endpoint in ("/api/devices", "/api/devices/diff", "/api/control")
+        ]
+        core.manager.shutdown()
+
+    report = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "iterations": args.iterations,
+            "llm_latency": args.llm_latency,
+            "stream": args.stream,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+        },
+        "startup": startup,
+        "latency": latency,
+        "llm_usage": llm_usage,
+        "response_cache": response_cache,
+        "throughput": throughput,
+    }
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    if not args.keep:
+        sim.cleanup(workdir)
+
+    print(f"启动: 构造 {startup['construct_seconds']:.2f}s，全部就绪 {startup['ready_seconds']:.2f}s")
+    for scenario, result in latency.items():
+        if "skipped" in result:
+            print(f"{scenario:<14}跳过: {result['skipped']}")
+            continue
+        total = result["stages"].get("total", {"count": 0})
+        if not total["count"]:
+            print(f"{scenario:<14}全部超时")
+            continue
+        detail = "  ".join(f"{stage} {summary['p50_ms']:.1f}" for stage, summary in result["stages"].items() if stage != "total")
+        print(f"{scenario:<14}p50 {total['p50_ms']:7.1f} ms  p99 {total['p99_ms']:7.1f} ms  ({detail})  超时 {result['timeouts']}")
+    print(f"LLM 请求 {llm_usage['requests']} 次，提示词 {llm_usage['prompt_tokens']} tokens，前缀缓存命中率 {llm_usage['cache_hit_rate']:.1%}")
+    for result in throughput:
+        print(f"{result['endpoint']:<20}{result['rps']:10.1f} req/s  p50 {result['p50_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  errors {result['errors']}")
+    print(f"报告已写入 {report_path}")
+
+
+if __name__ == "__main__":
+    main()
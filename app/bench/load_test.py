@@ -0,0 +1,116 @@
+"""
+API 压力测试.
+多个线程各自使用一个 keep-alive 会话，在指定时间内持续请求 /api/devices 与 /api/control，
+报告每个接口的每秒请求数与延迟分位数。
+用法: python app/bench/load_test.py --url http://127.0.0.1:5000 --key debug_key --concurrency 16 --duration 10
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+
+import requests
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def _selectable(device):
+    """ 当前状态中 __SELECT__ 字段的值都在可选项内，可以原样下发 """
+    selection = device["param"].get("selection")
+    if not isinstance(selection, dict):
+        return False
+    present = device["param"]["present"]
+    for key, spec in selection.items():
+        if isinstance(spec, list) and spec[:1] == ["__SELECT__"] and present.get(key) not in spec[1:]:
+            return False
+    return True
+
+
+def control_payload(session, url):
+    """ 以第一个可控设备的当前状态作为控制命令，不改变设备状态 """
+    devices = session.get(f"{url}/api/devices").json()["devices"]
+    for device in devices:
+        if _selectable(device):
+            return json.dumps({"actions": [{"id": device["id"], "param": device["param"]["present"]}]})
+    device = devices[0]
+    return json.dumps({"actions": [{"id": device["id"], "param": device["param"]["present"]}]})
+
+
+def run(url, key, endpoint, concurrency, duration):
+    headers = {"X-API-Key": key, "Accept-Encoding": "gzip"}
+    setup = requests.Session()
+    setup.headers.update(headers)
+    payload = control_payload(setup, url) if endpoint == "/api/control" else None
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        nonlocal errors
+        session = requests.Session()
+        session.headers.update(headers)
+        local = []
+        local_errors = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                if payload is None:
+                    response = session.get(url + endpoint)
+                else:
+                    response = session.post(url + endpoint, data=payload)
+                if response.status_code >= 400:
+                    local_errors += 1
+            except requests.RequestException:
+                local_errors += 1
+                continue
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            errors += local_errors
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "endpoint": endpoint,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="hi-core API load test")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--key", default="debug_key")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--endpoints", nargs="+", default=["/api/devices", "/api/control"])
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    results = [run(args.url.rstrip("/"), args.key, endpoint, args.concurrency, args.duration) for endpoint in args.endpoints]
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+    print(f"concurrency: {args.concurrency}, duration: {args.duration}s")
+    for result in results:
+        print(f"{result['endpoint']:<16}{result['rps']:10.1f} req/s  p50 {result['p50_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  errors {result['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,14 @@ import time
 import json
 import copy
 import toml
-import sqlite3
 import threading
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from modules.api import Hi_AI
+from modules.runtime import storage, events, dispatcher, rules, snapshot, bus, state, schema, persist, readiness, scheduler, metrics, tracing
 from modules.devices import device_classes
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
@@ -31,6 +31,10 @@ with open(os.getcwd() + "/source/config.toml", "r", encoding="utf-8") as f:
 
 app = Flask(__name__)
 
+_cmd_seconds = metrics.histogram("hi_cmd_seconds", "cmd() 处理一批动作的耗时（秒）")
+_cmd_actions_total = metrics.counter("hi_cmd_actions_total", "cmd() 应用的动作数（applied）与校验错误数（error）", ["result"])
+_triggers_total = metrics.counter("hi_triggers_total", "设备触发事件数", ["device"])
+
 class DeviceManager:
     def __init__(self):
         self.debug_value = os.environ.get('DEBUG')
@@ -44,93 +48,104 @@ class DeviceManager:
             "devices": []
         }
         self.device_instances = {}
-        self.init_time_dict = {}
+        # 设备的周期任务与超时共用一个调度器，需在构造设备前创建
+        self.scheduler = scheduler.get_scheduler(workers=int(config["core"].get("scheduler_workers", 4)))
+        self._state_lock = threading.Lock()
+        self._schemas = {}
+        self._clamp = bool(config["core"].get("clamp", True))
+        self._init_workers = int(config["core"].get("init_workers", 4))
+        self._init_timeout = float(config["core"].get("init_timeout", 10))
+        self._init_timeouts = config["core"].get("device_init_timeout", {})
+        self.state = state.StateStore(history=int(config["http"].get("state_history", 1024)))
+        self.event_bus = bus.EventBus(
+            history=int(config["http"].get("events_history", 256)),
+            buffer_size=int(config["http"].get("events_buffer", 64))
+        )
+        self.readiness = readiness.ReadinessTracker(
+            buffer_size=int(config["core"].get("ready_buffer", 16)),
+            on_ready=self._on_device_ready
+        )
         self.sys_param = {}
         self.hi_ai = Hi_AI.HIAI_auto()
-        self.trig_device_config = {"action": "trigger", "devices": []}
+        self._triggers = events.TriggerQueue()
+        self._polled_devices = []
+        self._rules = rules.RuleEngine(config.get("rules", []))
+        dispatch_config = config.get("dispatch", {})
+        self._coalesce_window = float(dispatch_config.get("coalesce_window", 0.05))
+        self._dispatcher = dispatcher.TriggerDispatcher(
+            oprate=self.hi_ai.oprate,
+            apply=self.cmd,
+            workers=int(dispatch_config.get("workers", 4)),
+            max_inflight=int(dispatch_config.get("max_inflight", 4)),
+            safety_reserved=int(dispatch_config.get("safety_reserved", 1)),
+            queue_size=int(dispatch_config.get("queue_size", 8)),
+            stale_after=float(dispatch_config.get("stale_after", 30)),
+            priority_map=dispatch_config.get("priority", {}),
+            rules=self._rules,
+            stream=self.hi_ai.stream
+        )
         self.special_device_config = {"devices": []}
         self._db_file = os.getcwd() + "/source/data.db"
-        self._writting_db = False
+        self._store = storage.ParamStore(self._db_file)
         self.uid ="10001"
         self._init_db()
+        persist_config = config.get("persist", {})
+        self._persist = persist.WriteBehind(
+            self._store,
+            table="param",
+            interval=float(persist_config.get("interval", 1.0)),
+            max_pending=int(persist_config.get("max_pending", 64)),
+            journal=os.getcwd() + "/source/" + persist_config.get("journal", "param.journal"),
+            fsync=bool(persist_config.get("fsync", True))
+        )
+        trace_config = config.get("trace", {})
+        self.tracer = None
+        if trace_config.get("enabled", True):
+            dump_path = None
+            if trace_config.get("dump", "traces.jsonl") != "":
+                dump_path = os.getcwd() + "/source/" + trace_config.get("dump", "traces.jsonl")
+            self.tracer = tracing.Tracer(
+                capacity=int(trace_config.get("capacity", 256)),
+                outlier_seconds=float(trace_config.get("outlier_ms", 3000)) / 1000,
+                dump_path=dump_path,
+                settle=float(trace_config.get("settle", 5)),
+                auto_dump=bool(trace_config.get("auto_dump", False)),
+                max_bytes=int(trace_config.get("dump_max_kb", 1024)) * 1024
+            )
+        self._register_metrics()
         self._initialize_devices()
-        self._start_device_initialization()
+
+    def _register_metrics(self):
+        """ 队列深度、线程数等在输出指标时才读取的值 """
+        def queue_depths():
+            depths = {"trigger": self._triggers.qsize(), "persist": self._persist.pending(), "scheduler": self.scheduler.stats()["queued"]}
+            for priority, depth in self._dispatcher.queue_depths().items():
+                depths["dispatch_" + priority] = depth
+            return depths
+
+        def device_states():
+            states = {}
+            for device in self.readiness.health()["devices"]:
+                states[device["state"]] = states.get(device["state"], 0) + 1
+            return states
+
+        metrics.gauge("hi_queue_depth", "队列中等待处理的数量", ["queue"], func=queue_depths)
+        metrics.gauge("hi_threads", "进程中存活的线程数", func=threading.active_count)
+        metrics.gauge("hi_event_subscribers", "事件推送的订阅者数", func=self.event_bus.subscriber_count)
+        metrics.gauge("hi_devices", "各就绪状态的设备数", ["state"], func=device_states)
+        metrics.gauge("hi_state_version", "设备状态的版本号", func=lambda: self.state.version)
 
     def _init_db(self, force=False):
-        self._writting_db = True
-        conn = sqlite3.connect(self._db_file)
-        cursor = conn.cursor()
-        if force:
-            cursor.execute("DROP TABLE IF EXISTS param")
-            conn.commit()
-            cursor.execute("DROP TABLE IF EXISTS userinfo")
-            conn.commit()
-        cursor.execute("CREATE TABLE IF NOT EXISTS param (id TEXT PRIMARY KEY, param BLOB)")
-        conn.commit()
-        cursor.execute("CREATE TABLE IF NOT EXISTS userinfo (id TEXT PRIMARY KEY, param BLOB)")
-        conn.commit()
-        cursor.close()
-        conn.close()
-        self._writting_db = False
+        self._store.init_tables(force=force)
 
     def _read_param_from_db(self, db, id, timeout=5):
-        for i in range(timeout * 2):
-            if self._writting_db:
-                time.sleep(0.5)
-            else:
-                break
-            if i == timeout * 2 - 1:
-                return None
-            
-        self._writting_db = True
-        conn = sqlite3.connect(self._db_file)
-        cursor = conn.cursor()
-        query = f"SELECT param FROM {db} WHERE id=?"
-        cursor.execute(query, (id,))
-        result = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        self._writting_db = False
-        if result:
-            return json.loads(result[0][0].decode("utf-8"))
-        else:
-            return None
+        return self._store.read(db, id)
 
     def _write_param_to_db(self, db, id, value, timeout=5):
-        for i in range(timeout * 2):
-            if self._writting_db:
-                time.sleep(0.5)
-            else:
-                break
-            if i == timeout * 2 - 1:
-                return "Failure"
-        self._writting_db = True
-        conn = sqlite3.connect(self._db_file)
-        cursor = conn.cursor()
-        query = f"INSERT INTO {db} (id, param) VALUES (?, ?)"
-        cursor.execute(query, (id, json.dumps(value).encode("utf-8")))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        self._writting_db = False
+        return self._store.write(db, id, value)
 
     def _update_param_in_db(self, db, id, value, timeout=5):
-        for i in range(timeout * 2):
-            if self._writting_db:
-                time.sleep(0.5)
-            else:
-                break
-            if i == timeout * 2 - 1:
-                return "Failure"
-        self._writting_db = True
-        conn = sqlite3.connect(self._db_file)
-        cursor = conn.cursor()
-        query = f"UPDATE {db} SET param=? WHERE id=?"
-        cursor.execute(query, (json.dumps(value).encode("utf-8"), id))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        self._writting_db = False
+        return self._store.update(db, id, value)
 
     def _compare_keys(self, dict1, dict2):
         if set(dict1.keys()) != set(dict2.keys()):
@@ -148,123 +163,225 @@ class DeviceManager:
             self.all_device_config["init_param"] = userinfo
         else:
             self._write_param_to_db(db="userinfo", id=self.uid, value=self.all_device_config["init_param"], timeout=5)
-        i = 0
-        for name, DeviceClass in device_classes.items():
-            try:
-                device = DeviceClass()
-                print(f"Initializing {device.data['name']}...")
-                
-                if hasattr(device, "seed"):
-                    param = self._read_param_from_db(db="param", id=device.seed)
-                    if param:
-                        device.data["param"]["present"] = param
-                    else:
-                        self._write_param_to_db(db="param", id=device.seed, value=device.data["param"]["present"])
-                    device.unlock()
-                
-                device.data["id"] = i
-                i += 1
+        self.state.set_init_param(self.all_device_config["init_param"])
+
+        # id 按全部已发现模块的名称排序分配，与构造完成的先后无关；停用或缺少依赖的模块留空其 id，不影响其他设备
+        ids = {name: i for i, name in enumerate(sorted(device_classes.manifests))}
+        names = sorted(device_classes)
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self._init_workers, len(names))), thread_name_prefix="device-init")
+        start = time.time()
+        for name in names:
+            self.readiness.add(ids[name], name)
+        # 设备模块在线程池中按需导入并构造
+        pending = {executor.submit(lambda name=name: device_classes[name]()): name for name in names}
+        deadlines = {name: start + float(self._init_timeouts.get(name, self._init_timeout)) for name in names}
+        while pending:
+            timeout = max(0, min(deadlines[name] for name in pending.values()) - time.time())
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                self._register_device(name, ids[name], future)
+            for future, name in list(pending.items()):
+                if time.time() >= deadlines[name]:
+                    # 构造超时的设备在后台继续，完成后再注册
+                    print(f"{name} 初始化超过 {deadlines[name] - start:.0f}s，继续启动，完成后再加入")
+                    pending.pop(future)
+                    future.add_done_callback(lambda future, name=name: self._register_device(name, ids[name], future, late=True))
+        executor.shutdown(wait=False)
+
+        with self._state_lock:
+            self._rules.bind(self.all_device_config["devices"])
+        self._refresh_prompt()
+        print(device_classes.format_report())
+
+        if self.debug_value == 'True':
+            print(json.dumps(self.all_device_config, indent=4))
+
+    def _register_device(self, name, device_id, future, late=False):
+        """ 注册构造完成的设备，构造失败时只打印错误 """
+        try:
+            device = future.result()
+            print(f"Initializing {device.data['name']}...")
+
+            if hasattr(device, "seed"):
+                param = self._read_param_from_db(db="param", id=device.seed)
+                if param:
+                    device.data["param"]["present"] = param
+                else:
+                    self._write_param_to_db(db="param", id=device.seed, value=device.data["param"]["present"])
+
+            with self._state_lock:
+                device.data["id"] = device_id
                 self.all_device_config["devices"].append(device.data)
+                self.state.register(device.data)
+                self._schemas[device_id] = schema.DeviceSchema(device.data["param"], clamp=self._clamp)
                 if hasattr(device, "special"):
                     if device.special:
                         tmp_data = copy.deepcopy(device.data)
                         tmp_data["uuid"] = device.sys_param["uuid"]
                         self.special_device_config["devices"].append(tmp_data)
-                
-                if device.init_time != 0:
-                    self.init_time_dict[device.data["id"]] = device.init_time
-                
-                self.device_instances[device.data["id"]] = device
-                
-                self.sys_param[device.data["id"]] = device.sys_param
-            
-            except Exception as e:
-                print(f"Failed to initialize {name}: {e}")
-                continue
-        
-        self.hi_ai.set_data(json.dumps(self.all_device_config))
-        
-        if self.debug_value == 'True':
-            print(json.dumps(self.all_device_config, indent=4))
 
-    def _start_device_initialization(self):
-        """ 使用线程池初始化设备 """
-        def init_device(device_id, wait_time):
-            time.sleep(wait_time)
-            print(f"设备 {device_id} 初始化完成")
-            return device_id
-
-        if len(self.init_time_dict):
-            with ThreadPoolExecutor(max_workers=len(self.init_time_dict)) as executor:
-                future_to_device = {
-                    executor.submit(init_device, device_id, wait_time): device_id
-                    for device_id, wait_time in self.init_time_dict.items()
-                }
-                for future in as_completed(future_to_device):
-                    device_id = future_to_device[future]
-                    try:
-                        result = future.result()
-                        self.init_time_dict.pop(result, None)
-                        print(f"已删除 {result} 的初始化标志, 剩余标志：{self.init_time_dict}")
-                    except Exception as exc:
-                        print(f"设备 {device_id} 初始化时发生异常: {exc}")
+                self.device_instances[device_id] = device
+                self.sys_param[device_id] = device.sys_param
+                if late:
+                    self._rules.bind(self.all_device_config["devices"])
+            self._bind_hooks(device)
+            if late:
+                self._refresh_prompt()
+                self.event_bus.publish("device", device_id, self.state.present(device_id))
+            self.readiness.constructed(device)
+        except Exception as e:
+            print(f"Failed to initialize {name}: {e}")
+            self.readiness.mark_failed(device_id, e)
+
+    def _on_device_ready(self, device_id, trig_events):
+        """ 设备就绪后重新投递其暂存的触发事件 """
+        for event in trig_events:
+            self._triggers.put_event(event)
+        self.event_bus.publish("ready", device_id, None)
+
+    def _bind_hooks(self, device):
+        """
+        绑定设备钩子.
+        设备提供 on_trigger 时触发改为事件推送；没有 on_trigger 的输入设备退回轮询 trigger 标志，
+        带 selection 的执行器只接收命令、不会触发，不参与轮询。
+        提供 on_update 时，设备自行更新的状态会发布到事件总线。
+        """
+        if hasattr(device, "on_update"):
+            device.on_update = self._on_device_update
+        if not hasattr(device, "on_trigger"):
+            if "selection" not in device.data["param"]:
+                self._polled_devices.append(device.data["id"])
+            return
+        device.on_trigger = self._on_device_trigger
+        if device.trigger:
+            self._on_device_trigger(device)
+
+    def _on_device_trigger(self, device):
+        _triggers_total.labels(device.data["name"]).inc()
+        event = self._triggers.put(device.data["id"], device.data)
+        self.event_bus.publish("trigger", event.device_id, event.data["param"]["present"])
+
+    def _on_device_update(self, device):
+        device_id = device.data["id"]
+        if self.state.commit(device_id, device.data["param"]["present"]):
+            self.event_bus.publish("sensor", device_id, self.state.present(device_id))
+
+    @property
+    def state_version(self):
+        return self.state.version
+
+    def _refresh_prompt(self):
+        """ 在状态锁之外以状态存储的快照更新提示词，快照写时复制，无需再序列化与解析 """
+        self.sync_state()
+        # 先取结构版本号，期间注册的设备最多导致下一次多序列化一次
+        structure = self.state.structure_version
+        version, document = self.state.snapshot()
+        self.hi_ai.set_data(document, version, structure)
+
+    def sync_state(self):
+        """ 把设备线程直接修改的 present 提交到状态存储，没有变化的设备不产生新版本 """
+        for device_id, device in list(self.device_instances.items()):
+            self.state.commit(device_id, device.data["param"]["present"])
 
     def set_userinfo(self, data):
         if self._compare_keys(self.all_device_config["init_param"], json.loads(data)):
             self.all_device_config["init_param"] = json.loads(data)
+            self.state.set_init_param(self.all_device_config["init_param"])
+            self._refresh_prompt()
             self._update_param_in_db(db="userinfo", id=self.uid, value=json.loads(data), timeout=5)
 
 
+    def shutdown(self):
+        """ 写入尚未持久化的参数 """
+        self._persist.close()
+
     def run(self):
-        """ 进入主循环，定期发送命令 """
+        """ 进入主循环，等待设备触发事件并交给调度器 """
         while True:
-            time.sleep(1)
-            self.trig_device_config["devices"] = []
-            for device_id, device in self.device_instances.items():
-                if device.trigger and self.init_time_dict.get(device_id) is None:
-                    self.trig_device_config["devices"].append(device.data)
-                    device.trigger = False
-            if self.trig_device_config["devices"]:
-                print(json.dumps(self.trig_device_config, indent=4))
-                logging.info(json.dumps(self.trig_device_config, indent=4))
-                data = self.hi_ai.oprate(json.dumps(self.trig_device_config))
-                print(data)
-                self.cmd(data)
-                logging.info(data)
+            timeout = 1 if self._polled_devices else None
+            trig_events = self._triggers.wait(timeout=timeout, window=self._coalesce_window)
+            for device_id in self._polled_devices:
+                device = self.device_instances[device_id]
+                # 轮询设备的 trigger 标志会一直保持，就绪后再处理
+                if device.trigger and self.readiness.is_ready(device_id):
+                    trig_events.append(events.TriggerEvent(device_id, device.data))
+            ready_events = []
+            for event in trig_events:
+                # 未就绪设备的触发暂存，就绪后重新投递
+                if not self.readiness.is_ready(event.device_id) and self.readiness.buffer(event):
+                    continue
+                ready_events.append(event)
+                self.device_instances[event.device_id].trigger = False
+                if self.tracer is not None:
+                    # 每个触发一个 Trace，从设备触发的时刻开始计时
+                    event.trace = self.tracer.start("trigger", start=event.time, device=event.data["name"], device_id=event.device_id)
+                    event.trace.add("trigger.wait", event.time, time.time())
+            if ready_events:
+                with tracing.activate(getattr(event, "trace", None) for event in ready_events):
+                    self._dispatcher.dispatch(ready_events)
 
     def cmd(self, data):
+        """
+        批量执行动作.
+        先按设备的 selection 声明校验整批动作，再在锁内一次性修改状态，每批只序列化一次配置、写一次数据库。
+        不合法的字段被跳过，其余字段照常执行。
+        :return: {"applied": 已修改的设备 id 列表, "errors": 错误列表}
+        """
+        with _cmd_seconds.time():
+            result = self._cmd(data)
+        _cmd_actions_total.labels("applied").inc(len(result["applied"]))
+        _cmd_actions_total.labels("error").inc(len(result["errors"]))
+        return result
+
+    def _cmd(self, data):
         try:
             data_decode = json.loads(data)
             logging.info(data_decode)
         except json.JSONDecodeError:
             logging.error("无法解析 JSON 数据")
-            return
-        if not "actions" in data_decode:
-            return
-        for item in data_decode["actions"]:
-            if self.device_instances[item["id"]]:
-                device_instances_present = copy.deepcopy(self.device_instances[item["id"]].data["param"]["present"])
-                all_device_config_present = copy.deepcopy(self.all_device_config["devices"][item["id"]]["param"]["present"])
-                for key, value in item["param"].items():
-                    if key in device_instances_present:
-                        expected_type = type(device_instances_present[key])
-                        try:
-                            device_instances_present[key] = expected_type(value)
-                        except (ValueError, TypeError):
-                            print(f"参数转换失败：键 '{key}'，值 '{value}' 无法转换为 {expected_type.__name__}")
-                    if key in all_device_config_present:
-                        expected_type = type(all_device_config_present[key])
-                        try:
-                            all_device_config_present[key] = expected_type(value)
-                        except (ValueError, TypeError):
-                            print(f"参数转换失败：键 '{key}'，值 '{value}' 无法转换为 {expected_type.__name__}")
-                self.device_instances[item["id"]].data["param"]["present"] = copy.deepcopy(device_instances_present)
-                self.all_device_config["devices"][item["id"]]["param"]["present"] = copy.deepcopy(all_device_config_present)
-                del device_instances_present
-                del all_device_config_present
-                self.hi_ai.set_data(json.dumps(self.all_device_config))
-                if hasattr(self.device_instances[item["id"]], "seed"):
-                    self._update_param_in_db(db="param", id=self.device_instances[item["id"]].seed, value=item["param"])
+            return {"applied": [], "errors": [{"index": None, "id": None, "field": None, "error": "invalid json"}]}
+        if not isinstance(data_decode, dict) or not isinstance(data_decode.get("actions"), list):
+            return {"applied": [], "errors": [{"index": None, "id": None, "field": None, "error": "missing actions"}]}
+        with tracing.span("cmd.validate"):
+            updates, errors = schema.validate_actions(data_decode["actions"], self._schemas)
+        for error in errors:
+            print(f"动作校验失败：{error}")
+        if not updates:
+            return {"applied": [], "errors": errors}
+        changed = []
+        diffs = []
+        persisted = {}
+        start = time.perf_counter()
+        wait_start = time.time()
+        with self._state_lock:
+            metrics.lock_wait_seconds.labels("state").observe(time.perf_counter() - start)
+            tracing.record("cmd.lock_wait", wait_start)
+            apply_start = time.time()
+            for device_id, values in updates:
+                device = self.device_instances[device_id]
+                present = device.data["param"]["present"]
+                diff = {key: value for key, value in values.items() if present.get(key) != value}
+                present.update(values)
+                if diff:
+                    diffs.append((device, diff))
+                if self.state.commit(device_id, present):
+                    changed.append(device_id)
+                if hasattr(device, "seed"):
+                    persisted[device.seed] = self.state.present(device_id)
+            tracing.record("cmd.apply", apply_start, devices=len(updates))
+        # 把变化的字段直接交给设备驱动，驱动无需轮询状态
+        with tracing.span("cmd.on_change"):
+            for device, diff in diffs:
+                if hasattr(device, "on_change"):
+                    device.on_change(diff)
+        with tracing.span("cmd.prompt"):
+            self._refresh_prompt()
+        for device_id in changed:
+            self.event_bus.publish("state", device_id, self.state.present(device_id))
+        with tracing.span("persist.journal"):
+            self._persist.put_many(persisted)
+        return {"applied": [device_id for device_id, _ in updates], "errors": errors}
 
 
 
@@ -293,19 +410,155 @@ def authenticate():
 
 threading.Thread(target=run_manager, daemon=True).start()
 
+# 预先序列化的设备状态，状态未变化时直接复用
+snapshot_refresh = float(config["http"].get("snapshot_refresh", 1.0))
+compress_min_size = int(config["http"].get("compress_min_size", 1024))
+def build_devices():
+    manager.sync_state()
+    return json.dumps(manager.state.snapshot()[1]).encode("utf-8")
+
+devices_snapshot = snapshot.SnapshotCache(build_devices, version=lambda: manager.state_version, refresh=snapshot_refresh)
+special_devices_snapshot = snapshot.SnapshotCache(lambda: json.dumps(manager.special_device_config).encode("utf-8"), version=lambda: manager.state_version, refresh=snapshot_refresh)
+sys_param_snapshot = snapshot.SnapshotCache(lambda: json.dumps(manager.sys_param).encode("utf-8"), version=lambda: manager.state_version, refresh=snapshot_refresh)
+
+def snapshot_response(cache):
+    """ 返回快照内容，支持 If-None-Match 与 gzip/br 压缩 """
+    snap = cache.get()
+    encoding = snapshot.accepted_encoding(request.accept_encodings, compress_min_size, snap.body)
+    body, etag = snap.encode(encoding)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="application/json")
+        if encoding is not None:
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(etag)
+    response.vary.add("Accept-Encoding")
+    return response
+
 # 定义一个 GET 接口，用于读取所有设备的数据
 @app.route('/api/devices', methods=['GET'])
 def get_devices():
-    # 直接返回 DeviceManager 实例中的 all_json_data 数据
-    return jsonify(manager.all_device_config)
+    return snapshot_response(devices_snapshot)
+
+# 返回自 since 版本以来的 JSON Patch 操作，since 缺省或过旧时返回替换整个文档的操作
+@app.route('/api/devices/diff', methods=['GET'])
+def get_devices_diff():
+    try:
+        since = int(request.args["since"]) if "since" in request.args else None
+    except ValueError:
+        return jsonify({"error": "Invalid version"}), 400
+    manager.sync_state()
+    version, ops = manager.state.diff(since)
+    return jsonify({"version": version, "ops": ops})
+
+# 每个设备的就绪状态与初始化耗时
+@app.route('/api/devices/health', methods=['GET'])
+def get_devices_health():
+    return jsonify(manager.readiness.health())
+
+# 调度器中每个任务的执行次数、耗时与延迟
+@app.route('/api/debug/scheduler', methods=['GET'])
+def get_scheduler_stats():
+    return jsonify(manager.scheduler.stats())
+
+# LLM 请求数、提示词 token 数及命中服务端前缀缓存的比例，以及本地响应缓存的命中情况
+@app.route('/api/debug/llm', methods=['GET'])
+def get_llm_stats():
+    return jsonify({"usage": manager.hi_ai.usage_stats(), "cache": manager.hi_ai.cache_stats()})
+
+def _traces_min_seconds():
+    return float(request.args.get("min_ms", 0)) / 1000
+
+# 最近的触发 Trace，按开始时间从新到旧，format=text 时以文本瀑布图返回
+@app.route('/api/debug/traces', methods=['GET'])
+def get_traces():
+    if manager.tracer is None:
+        return jsonify({"error": "Tracing disabled"}), 404
+    try:
+        limit = int(request.args.get("limit", 20))
+        if limit < 1:
+            raise ValueError("limit")
+        traces = manager.tracer.recent(limit=limit, min_seconds=_traces_min_seconds())
+    except ValueError:
+        return jsonify({"error": "Invalid parameter"}), 400
+    if request.args.get("format") == "text":
+        return Response("\n\n".join(trace.waterfall() for trace in traces) + "\n", mimetype="text/plain")
+    return jsonify({"traces": [trace.to_dict() for trace in traces]})
+
+@app.route('/api/debug/traces/<trace_id>', methods=['GET'])
+def get_trace(trace_id):
+    trace = manager.tracer.get(trace_id) if manager.tracer is not None else None
+    if trace is None:
+        return jsonify({"error": "Trace not found"}), 404
+    if request.args.get("format") == "text":
+        return Response(trace.waterfall() + "\n", mimetype="text/plain")
+    return jsonify(trace.to_dict())
+
+# 把缓冲区中总耗时不低于 min_ms（缺省为 [trace] outlier_ms）的 Trace 追加到导出文件
+@app.route('/api/debug/traces/dump', methods=['POST'])
+def dump_traces():
+    if manager.tracer is None or manager.tracer.dump_path is None:
+        return jsonify({"error": "Trace dump disabled"}), 404
+    try:
+        min_seconds = _traces_min_seconds() if "min_ms" in request.args else None
+    except ValueError:
+        return jsonify({"error": "Invalid parameter"}), 400
+    written = manager.tracer.dump_outliers(min_seconds)
+    return jsonify({"written": written, "path": manager.tracer.dump_path})
+
+# Prometheus 文本格式的运行指标
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
 
 @app.route('/api/special_devices', methods=['GET'])
 def get_special_devices():
-    return jsonify(manager.special_device_config)
+    return snapshot_response(special_devices_snapshot)
 
 @app.route('/api/devices/sys_param', methods=['GET'])
 def get_uuid():
-    return jsonify(manager.sys_param)
+    return snapshot_response(sys_param_snapshot)
+
+def _events_since():
+    since = request.headers.get("Last-Event-ID") or request.args.get("since")
+    try:
+        return int(since) if since is not None else None
+    except ValueError:
+        return None
+
+# 设备状态变化的推送接口，默认为 SSE，mode=poll 时为长轮询
+@app.route('/api/events', methods=['GET'])
+def get_events():
+    since = _events_since()
+    if request.args.get("mode") == "poll":
+        try:
+            timeout = min(float(request.args.get("timeout", 25)), 60)
+        except ValueError:
+            return jsonify({"error": "Invalid parameter"}), 400
+        if not timeout >= 0:
+            return jsonify({"error": "Invalid parameter"}), 400
+        subscription = manager.event_bus.subscribe(since)
+        try:
+            events = subscription.get(timeout=timeout)
+        finally:
+            manager.event_bus.unsubscribe(subscription)
+        return jsonify({"version": subscription.last_version, "events": events})
+
+    def generate():
+        subscription = manager.event_bus.subscribe(since)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                events = subscription.get(timeout=15)
+                if not events:
+                    yield ": keepalive\n\n"
+                for event in events:
+                    yield f"id: {event['version']}\nevent: {event['kind']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            manager.event_bus.unsubscribe(subscription)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # 定义一个 POST 接口，用于下发控制命令
 @app.route('/api/control', methods=['POST'])
@@ -314,8 +567,12 @@ def control_device():
     if not data:
         return jsonify({"error": "Unsupport request"}), 400
     # cmd 函数接收的是 JSON 字符串，所以先将接收到的 JSON 数据转换为字符串再传入
-    manager.cmd(data)
-    return jsonify({"status": "OK"})
+    result = manager.cmd(data)
+    if not result["errors"]:
+        return jsonify({"status": "OK"})
+    if not result["applied"]:
+        return jsonify({"error": "Invalid actions", "errors": result["errors"]}), 400
+    return jsonify({"status": "Partial", "applied": result["applied"], "errors": result["errors"]})
 
 @app.route('/api/userinfo', methods=['GET'])
 def get_userinfo():
@@ -329,9 +586,50 @@ def set_userinfo():
     manager.set_userinfo(data)
     return jsonify({"status": "OK"})
 
-if __name__ == '__main__':
+def serve():
+    """
+    启动 API 服务.
+    [http] server 为 "cheroot" 时使用多线程的 cheroot WSGI 服务器，所有线程共享同一个 DeviceManager；
+    未安装 cheroot 或为 "dev" 时使用 Flask 开发服务器。
+    """
+    server_type = config["http"].get("server", "dev")
+    if server_type == "cheroot":
+        try:
+            from cheroot import wsgi
+        except ImportError:
+            print("未安装 cheroot，使用开发服务器")
+            server_type = "dev"
+    if server_type != "cheroot":
+        if https:
+            app.run(host=host, port=port, ssl_context=(cert, key), threaded=True)
+        else:
+            app.run(host=host, port=port, threaded=True)
+        return
+
+    threads = int(config["http"].get("threads", 16))
+    server = wsgi.Server(
+        (host, port),
+        app,
+        numthreads=threads,
+        max=int(config["http"].get("max_threads", threads * 2)),
+        timeout=int(config["http"].get("keepalive_timeout", 10)),
+        request_queue_size=int(config["http"].get("request_queue_size", 64)),
+        server_name="hi-core"
+    )
     if https:
-        app.run(host=host, port=port, ssl_context=(cert, key))
-    else:
-        app.run(host=host, port=port)
+        from cheroot.ssl.builtin import BuiltinSSLAdapter
+        server.ssl_adapter = BuiltinSSLAdapter(cert, key)
+    print(f"API 服务运行于 {'https' if https else 'http'}://{host}:{port}，线程数 {threads}")
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    try:
+        serve()
+    finally:
+        manager.shutdown()
         
\ No newline at end of file
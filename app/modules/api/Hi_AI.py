@@ -1,14 +1,29 @@
 import os
 import json
 import toml
-import copy
+import time
+import logging
+import threading
+from .cache import ResponseCache, state_fingerprint
+from .stream import ActionStreamParser
+from .prompt import PromptLayout
+from .context import ContextBuilder
+from .client import LLMUnavailableError
+from modules import sim
+from modules.runtime.metrics import counter, histogram
+from modules.runtime import tracing
 
 
 debug_value = os.environ.get('DEBUG')
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
 
 if debug_value == 'False' or debug_value is None:
-    from openai import OpenAI
+    from .client import LLMClient, CircuitBreaker
+
+_llm_seconds = histogram("hi_llm_seconds", "LLM 请求往返耗时（秒）", ["mode", "result"])
+_llm_first_action_seconds = histogram("hi_llm_first_action_seconds", "流式请求中第一个动作解析完成的耗时（秒）")
+_llm_cache_total = counter("hi_llm_cache_total", "响应缓存的查询次数", ["result"])
+_llm_tokens_total = counter("hi_llm_tokens_total", "提示词 token 数", ["kind"])
 
 
 class HIAI_auto:
@@ -17,51 +32,208 @@ class HIAI_auto:
             config = toml.load(f)
             if config["openai"]["api_key"] != "":
                 api_key = config["openai"]["api_key"]
+            self.stream = config["openai"].get("stream", False)
+            if config["openai"].get("api_base", "") != "":
+                api_base = config["openai"]["api_base"]
+            model = config["openai"].get("model", "deepseek-chat")
+            client_config = config["openai"]
+            context_budget = int(config["openai"].get("context_budget", 0))
+            context_relevance = config["openai"].get("relevance", {})
+            cache_config = config.get("cache", {})
+        self._cache = None
+        if cache_config.get("enabled", True):
+            cache_path = None
+            if cache_config.get("path", "") != "":
+                cache_path = os.getcwd() + "/source/" + cache_config["path"]
+            self._cache = ResponseCache(
+                maxsize=int(cache_config.get("maxsize", 256)),
+                ttl=float(cache_config.get("ttl", 600)),
+                path=cache_path
+            )
+        # 模拟模式下改用本地的模拟 LLM
+        endpoint = sim.llm_endpoint()
+        if endpoint is not None:
+            api_base, api_key = endpoint
         if debug_value == 'False' or debug_value is None:
-            self._client = OpenAI(api_key=api_key, base_url=api_base)
+            self._client = LLMClient(
+                api_key=api_key,
+                api_base=api_base,
+                model=model,
+                timeout=float(client_config.get("timeout", 20)),
+                retries=int(client_config.get("retries", 2)),
+                hedge=client_config.get("hedge", True),
+                max_connections=int(client_config.get("max_connections", 8)),
+                breaker=CircuitBreaker(
+                    threshold=int(client_config.get("breaker_threshold", 5)),
+                    cooldown=float(client_config.get("breaker_cooldown", 30))
+                )
+            )
         module_dir = os.path.dirname(__file__)
         tips_path = os.path.join(module_dir, "tips.md")
         with open(tips_path, "r", encoding="utf-8") as f:
             self._tips = f.read()
         self._data = {}
-        self._messages = [
-            {"role": "system", "content": self._tips},
-            {"role": "user", "content": self._data},
-            {"role": "assistant", "content": ""},
-            {"role": "user", "content": ""},
-            {"role": "assistant", "content": "```json\n", "prefix": True}
-        ]
-        
+        self._data_version = 0
+        self._data_lock = threading.Lock()
+        self._fingerprint = ""
+        context = None
+        if context_budget > 0:
+            context = ContextBuilder(budget=context_budget, relevance=context_relevance)
+        self._layout = PromptLayout(self._tips, context=context)
+        self._usage_lock = threading.Lock()
+        self._usage = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0}
+
+    def set_data(self, data, version=None, structure=None):
+        """
+        更新提示词使用的设备状态.
+        :param data: 设备配置字典（如状态存储的只读快照），也可以是 JSON 字符串
+        :param version: 快照的版本号，早于已应用版本的快照被忽略，并发调用时以最新的状态为准
+        :param structure: 设备结构的版本号，见 PromptLayout.set_state
+        """
+        if isinstance(data, str):
+            data = json.loads(data)
+        with self._data_lock:
+            if version is not None:
+                if version < self._data_version:
+                    return
+                self._data_version = version
+            self._data = data
+            self._layout.set_state(data, structure)
+            if self._cache is not None:
+                self._fingerprint = state_fingerprint(data)
+
+    def _record_usage(self, usage):
+        """ 记录提示词 token 数及命中服务端前缀缓存的 token 数 """
+        if usage is None:
+            return
+        cached = getattr(usage, "prompt_cache_hit_tokens", None)
+        if cached is None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached = getattr(details, "cached_tokens", 0) if details is not None else 0
+        _llm_tokens_total.labels("prompt").inc(usage.prompt_tokens or 0)
+        _llm_tokens_total.labels("cached").inc(cached or 0)
+        with self._usage_lock:
+            self._usage["requests"] += 1
+            self._usage["prompt_tokens"] += usage.prompt_tokens or 0
+            self._usage["cached_tokens"] += cached or 0
+        logging.info(f"prompt tokens: {usage.prompt_tokens}, cached: {cached}")
 
-    def set_data(self, data):
-        self._data = data
-        self._messages[1]["content"] = data
+    def usage_stats(self):
+        with self._usage_lock:
+            stats = dict(self._usage)
+        stats["cache_hit_rate"] = stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+        return stats
 
-    def oprate(self, data):
-        message = copy.deepcopy(self._messages)
-        message[3]["content"] = data
+    def cache_stats(self):
+        return self._cache.stats() if self._cache is not None else {}
+
+    def oprate(self, data, on_actions=None):
+        """
+        根据触发数据生成控制指令.
+        :param data: 触发数据 JSON 字符串
+        :param on_actions: 流式模式的回调，参数为一组已解析完成的动作，同一 chunk 中的动作合并为一次调用；为 None 时等待完整结果
+        :return: 完整的动作 JSON 字符串
+        """
+        key = None
+        if self._cache is not None:
+            key = self._cache.key(data, self._fingerprint)
+        if key is not None:
+            content = self._cache.get(key)
+            if content is not None:
+                _llm_cache_total.labels("hit").inc()
+                tracing.record("llm.cache_hit", time.time())
+                self._replay(content, on_actions)
+                return content
+            _llm_cache_total.labels("miss").inc()
+        delivered = []
+        if on_actions is not None:
+            callback = on_actions
+
+            def on_actions(actions):
+                delivered.extend(actions)
+                callback(actions)
+        try:
+            content = self._oprate(data, on_actions)
+        except LLMUnavailableError as e:
+            print(f"LLM 服务不可用: {e}")
+            if delivered:
+                # 流在中途断开，已执行的动作不再用缓存结果覆盖
+                return json.dumps({"actions": delivered})
+            # 服务不可用时退回到已过期的缓存结果，没有则不执行任何动作
+            content = self._cache.get(key, allow_stale=True) if key is not None else None
+            if content is None:
+                return json.dumps({"actions": []})
+            _llm_cache_total.labels("stale").inc()
+            self._replay(content, on_actions)
+            return content
+        if key is not None:
+            self._cache.put(key, content)
+        return content
+
+    def _replay(self, content, on_actions):
+        if on_actions is not None:
+            actions = json.loads(content)["actions"]
+            if actions:
+                on_actions(actions)
+
+    def _oprate(self, data, on_actions=None):
+        message = self._layout.messages(data)
         if debug_value == 'True':
+            # 调试模式下不请求 LLM，向 notify 设备发送一条调试消息
             data = {
                 "actions": [
                     {
-                    "id": 0,
+                        "id": device["id"],
                         "param": {
-                            "selection": {
-                                "notification": "Debug message",
-                            }
+                            "message": "Debug message"
                         }
                     }
+                    for device in self._data.get("devices", []) if device.get("name") == "notify"
                 ]
             }
+            if on_actions is not None:
+                on_actions(data["actions"])
             return json.dumps(data)
-        else:
-            completion  = self._client.chat.completions.create(
-                model="deepseek-chat",
+        mode = "stream" if on_actions is not None else "complete"
+        start = time.perf_counter()
+        try:
+            with tracing.span("llm.request", mode=mode):
+                content = self._request(message, on_actions, start)
+        except Exception:
+            _llm_seconds.labels(mode, "error").observe(time.perf_counter() - start)
+            raise
+        _llm_seconds.labels(mode, "ok").observe(time.perf_counter() - start)
+        return content
+
+    def _request(self, message, on_actions, start):
+        if on_actions is not None:
+            parser = ActionStreamParser()
+            stream = self._client.stream(
                 messages=message,
-                stream=False,
+                stream_options={"include_usage": True},
                 stop=["```"],
             )
-            return completion.choices[0].message.content
+            first = True
+            for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    self._record_usage(chunk.usage)
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                actions = parser.feed(chunk.choices[0].delta.content)
+                if not actions:
+                    continue
+                if first:
+                    _llm_first_action_seconds.observe(time.perf_counter() - start)
+                    tracing.record("llm.first_action", time.time())
+                    first = False
+                on_actions(actions)
+            return parser.text()
+        completion = self._client.complete(
+            messages=message,
+            stop=["```"],
+        )
+        self._record_usage(completion.usage)
+        return completion.choices[0].message.content
 
 
 if __name__ == '__main__':
@@ -1 +1,6 @@
-from .Hi_AI import *
\ No newline at end of file
+from .Hi_AI import *
+from .cache import *
+from .stream import *
+from .prompt import *
+from .context import *
+from .client import *
@@ -0,0 +1,157 @@
+import os
+import json
+import math
+import time
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def _normalize(value):
+    """ 归一化触发数据：字符串去除首尾空白并转小写，数值保留两位有效数字 """
+    if isinstance(value, dict):
+        return {key: _normalize(value[key]) for key in sorted(value)}
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    if isinstance(value, str):
+        return " ".join(value.split()).lower()
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        if value == 0:
+            return 0
+        # inf 与 nan 无法分桶，原样参与键的计算
+        if isinstance(value, float) and not math.isfinite(value):
+            return value
+        digits = 1 - int(math.floor(math.log10(abs(value))))
+        return round(value, digits)
+    return value
+
+
+def _digest(value):
+    raw = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def state_fingerprint(all_device_config):
+    """ 可控设备（带 selection）当前状态的指纹，状态变化后缓存自然失效 """
+    state = {}
+    for device in all_device_config.get("devices", []):
+        param = device.get("param", {})
+        if "selection" in param:
+            state[str(device.get("id"))] = param.get("present")
+    return _digest(state)
+
+
+class ResponseCache:
+    """
+    LLM 响应缓存.
+    以归一化后的触发数据与设备状态指纹为键，支持 TTL 过期、LRU 淘汰与可选的磁盘持久化。
+    """
+    def __init__(self, maxsize=256, ttl=600, path=None, save_every=16):
+        """
+        :param maxsize: 最大条目数
+        :param ttl: 条目有效期，单位秒
+        :param path: 持久化文件路径，为 None 时仅保存在内存中
+        :param save_every: 每新增多少条目写一次磁盘
+        """
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._path = path
+        self._save_every = save_every
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self._path:
+            self._load()
+            atexit.register(self.save)
+
+    def key(self, trig_data, fingerprint):
+        """
+        :param trig_data: 触发数据 JSON 字符串
+        :param fingerprint: 设备状态指纹
+        """
+        try:
+            trig = json.loads(trig_data)
+        except json.JSONDecodeError:
+            return None
+        devices = [
+            {"id": device.get("id"), "name": device.get("name"), "present": device.get("param", {}).get("present")}
+            for device in trig.get("devices", [])
+        ]
+        devices.sort(key=lambda device: str(device["id"]))
+        return _digest({"devices": _normalize(devices), "state": fingerprint})
+
+    def get(self, key, allow_stale=False):
+        """ 查询缓存，allow_stale 为 True 时忽略过期时间（用于服务不可用时的降级） """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (not allow_stale and entry[0] < time.time()):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        try:
+            if "actions" not in json.loads(value):
+                return
+        except (json.JSONDecodeError, TypeError):
+            return
+        with self._lock:
+            self._entries[key] = (time.time() + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._dirty += 1
+            save = self._path is not None and self._dirty >= self._save_every
+        if save:
+            self.save()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _load(self):
+        if not os.path.exists(self._path):
+            return
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"读取响应缓存失败: {e}")
+            return
+        now = time.time()
+        for key, (expires, value) in entries.items():
+            if expires > now:
+                self._entries[key] = (expires, value)
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def save(self):
+        if not self._path:
+            return
+        with self._lock:
+            entries = {key: list(entry) for key, entry in self._entries.items()}
+            self._dirty = 0
+        tmp_path = self._path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            print(f"保存响应缓存失败: {e}")
+
+
+__all__ = ["ResponseCache", "state_fingerprint"]
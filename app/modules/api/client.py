@@ -0,0 +1,248 @@
+import time
+import queue
+import asyncio
+import logging
+import threading
+from collections import deque
+
+
+class LLMUnavailableError(Exception):
+    """ 重试耗尽或熔断器打开，服务暂不可用 """
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """ 熔断器处于打开状态，请求未发出 """
+
+
+class CircuitBreaker:
+    """
+    熔断器.
+    连续失败 threshold 次后打开，cooldown 秒内直接拒绝请求；
+    冷却结束后进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开。
+    """
+    def __init__(self, threshold=5, cooldown=30):
+        self._threshold = threshold
+        self._cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.time() - self._opened_at >= self._cooldown:
+                return "half_open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.time() - self._opened_at < self._cooldown or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self._threshold:
+                self._opened_at = time.time()
+            self._probing = False
+
+    def release(self):
+        """ 请求被取消，既未成功也未失败，放弃本次探测 """
+        with self._lock:
+            self._probing = False
+
+
+_END = object()
+
+
+class LLMClient:
+    """
+    异步 LLM 客户端.
+    在独立线程中运行事件循环，通过 AsyncOpenAI 与 httpx 连接池复用长连接；
+    每个请求有截止时间，可重试的错误按指数退避重试。
+    积累足够的延迟样本后，请求超过 p95 延迟仍未返回时会对冲发出第二个相同请求，取先完成者。
+    连续失败时熔断器打开，期间请求直接失败，由调用方降级处理。
+    同步方法可在任意线程中调用。
+    """
+    def __init__(self, api_key, api_base, model="deepseek-chat", timeout=20, retries=2, backoff=0.5, hedge=True, hedge_min_samples=20, max_connections=8, breaker=None):
+        """
+        :param api_key: API 密钥
+        :param api_base: OpenAI 兼容接口地址
+        :param model: 模型名称
+        :param timeout: 单次调用（含重试）的截止时间，单位秒
+        :param retries: 失败后的最大重试次数
+        :param backoff: 首次重试前的等待时间，之后每次翻倍
+        :param hedge: 是否启用对冲请求
+        :param hedge_min_samples: 启用对冲所需的最少延迟样本数
+        :param max_connections: 连接池大小
+        :param breaker: CircuitBreaker 实例，为 None 时使用默认参数
+        """
+        import openai
+
+        self._model = model
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff = backoff
+        self._hedge = hedge
+        self._hedge_min_samples = hedge_min_samples
+        self._breaker = breaker or CircuitBreaker()
+        self._latencies = deque(maxlen=200)
+        self._retriable = (
+            asyncio.TimeoutError,
+            openai.APIConnectionError,
+            openai.RateLimitError,
+            openai.InternalServerError,
+        )
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+        async def create_client():
+            http_client = None
+            try:
+                import httpx
+                http_client = openai.DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+                    timeout=timeout,
+                )
+            except ImportError:
+                # 没有 httpx 时使用 SDK 默认的连接池
+                pass
+            return openai.AsyncOpenAI(api_key=api_key, base_url=api_base, max_retries=0, timeout=timeout, http_client=http_client)
+
+        self._client = asyncio.run_coroutine_threadsafe(create_client(), self._loop).result()
+
+    @property
+    def breaker(self):
+        return self._breaker
+
+    def p95(self):
+        """ 最近请求的 p95 延迟，样本不足时返回 None """
+        samples = sorted(self._latencies)
+        if len(samples) < self._hedge_min_samples:
+            return None
+        return samples[int(0.95 * (len(samples) - 1))]
+
+    async def _create(self, messages, **kwargs):
+        start = time.perf_counter()
+        completion = await self._client.chat.completions.create(model=self._model, messages=messages, **kwargs)
+        self._latencies.append(time.perf_counter() - start)
+        return completion
+
+    async def _hedged(self, messages, **kwargs):
+        first = asyncio.ensure_future(self._create(messages, **kwargs))
+        second = None
+        try:
+            delay = self.p95() if self._hedge else None
+            if delay is None:
+                return await first
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if done:
+                return first.result()
+            logging.info(f"请求超过 p95 延迟 {delay:.2f}s，发出对冲请求")
+            second = asyncio.ensure_future(self._create(messages, **kwargs))
+            pending = {first, second}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # 截止时间到达或已取得结果时，不再等待仍在进行的请求
+            for task in (first, second):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def _with_retries(self, call):
+        for attempt in range(self._retries + 1):
+            if not self._breaker.allow():
+                raise CircuitOpenError("LLM circuit breaker is open")
+            try:
+                result = await call()
+            except self._retriable as e:
+                self._breaker.record_failure()
+                logging.warning(f"LLM 请求失败（第 {attempt + 1} 次）: {e!r}")
+                if attempt == self._retries:
+                    raise LLMUnavailableError(str(e)) from e
+                await asyncio.sleep(self._backoff * (2 ** attempt))
+            except asyncio.CancelledError:
+                # 截止时间到达，失败由调用方记录
+                self._breaker.release()
+                raise
+            except BaseException:
+                # 不可重试的错误同样计为失败，否则半开状态的探测标记无法清除
+                self._breaker.record_failure()
+                raise
+            else:
+                self._breaker.record_success()
+                return result
+
+    def complete(self, messages, **kwargs):
+        """ 同步调用，返回完整的 completion 对象 """
+        coro = asyncio.wait_for(self._with_retries(lambda: self._hedged(messages, **kwargs)), timeout=self._timeout)
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result()
+        except asyncio.TimeoutError as e:
+            self._breaker.record_failure()
+            raise LLMUnavailableError("LLM request deadline exceeded") from e
+
+    def stream(self, messages, **kwargs):
+        """ 同步流式调用，逐个返回 chunk；只有在收到第一个 chunk 之前的失败会重试 """
+        chunks = queue.Queue()
+        delivered = False
+
+        async def consume():
+            nonlocal delivered
+            response = await self._client.chat.completions.create(model=self._model, messages=messages, stream=True, **kwargs)
+            try:
+                async for chunk in response:
+                    chunks.put(chunk)
+                    delivered = True
+            except self._retriable as e:
+                if delivered:
+                    raise LLMUnavailableError(f"stream interrupted: {e!r}") from e
+                raise
+
+        async def run():
+            try:
+                await asyncio.wait_for(self._with_retries(consume), timeout=self._timeout)
+            except asyncio.TimeoutError:
+                self._breaker.record_failure()
+                chunks.put(LLMUnavailableError("LLM request deadline exceeded"))
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                chunks.put(_END)
+
+        asyncio.run_coroutine_threadsafe(run(), self._loop)
+        while True:
+            item = chunks.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+__all__ = ["CircuitBreaker", "CircuitOpenError", "LLMClient", "LLMUnavailableError"]
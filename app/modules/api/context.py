@@ -0,0 +1,130 @@
+import json
+
+
+# 触发设备（名称或类型）到相关设备（名称或类型）的映射，"*" 代表所有可控设备
+DEFAULT_RELEVANCE = {
+    "sensor": ["refrigeration", "draperies", "light", "virtual_out"],
+    "door": ["light", "virtual_out"],
+    "virtual_in": ["*"],
+}
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+def estimate_tokens(text):
+    """ 粗略估算 token 数：中日韩字符按 1 个计，其余字符按 4 个 1 token 计 """
+    wide = sum(1 for char in text if ord(char) > 0x2E80)
+    return wide + (len(text) - wide + 3) // 4
+
+
+def _texts(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _texts(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _texts(item)
+
+
+class ContextBuilder:
+    """
+    按触发裁剪发送给 LLM 的设备上下文.
+    只保留触发设备、触发内容中提到名称的设备以及相关性映射中的设备，
+    超出 token 预算时先去掉非触发设备的 readme，再按相关性从低到高移除设备。
+    """
+    def __init__(self, budget=2000, relevance=None):
+        """
+        :param budget: 设备上下文（不含系统提示）的 token 预算
+        :param relevance: 相关性映射，覆盖默认值
+        """
+        self._budget = budget
+        self._relevance = dict(DEFAULT_RELEVANCE)
+        self._relevance.update(relevance or {})
+
+    def _related(self, trig_device, device):
+        targets = self._relevance.get(trig_device.get("name"))
+        if targets is None:
+            targets = self._relevance.get(trig_device.get("type"), ["*"])
+        if "*" in targets and "selection" in device.get("param", {}):
+            return True
+        return device.get("name") in targets or device.get("type") in targets
+
+    def select(self, devices, trig_devices):
+        """
+        :param devices: 全部设备数据列表
+        :param trig_devices: 触发数据中的设备列表
+        :return: 按相关性从高到低排列的设备 id 列表
+        """
+        trig_ids = [device.get("id") for device in trig_devices]
+        texts = " ".join(text for device in trig_devices for text in _texts(device.get("param", {}).get("present", {})))
+        selected = list(trig_ids)
+        for device in devices:
+            if device["id"] not in selected and device.get("name") and device["name"] in texts:
+                selected.append(device["id"])
+        for device in devices:
+            if device["id"] not in selected and any(self._related(trig_device, device) for trig_device in trig_devices):
+                selected.append(device["id"])
+        return selected
+
+    def build(self, devices, init_param, trigger):
+        """
+        生成裁剪后的设备说明、状态与触发数据.
+        :param devices: 全部设备数据列表
+        :param init_param: 用户信息
+        :param trigger: 触发数据 JSON 字符串
+        :return: (设备说明, 设备状态, 触发数据) 三个 JSON 字符串
+        """
+        trig = json.loads(trigger)
+        trig_devices = trig.get("devices", [])
+        by_id = {device["id"]: device for device in devices}
+        selected = [device_id for device_id in self.select(devices, trig_devices) if device_id in by_id]
+        trig_ids = {device.get("id") for device in trig_devices}
+        readme = {device_id: True for device_id in selected}
+        compact_trigger = _dumps({
+            "action": "trigger",
+            "devices": [
+                {"id": device.get("id"), "name": device.get("name"), "param": {"present": device.get("param", {}).get("present")}}
+                for device in trig_devices
+            ],
+        })
+
+        def render():
+            schema = []
+            state = []
+            for device_id in selected:
+                device = by_id[device_id]
+                item = {"id": device_id, "name": device.get("name"), "type": device.get("type")}
+                if readme[device_id]:
+                    item["readme"] = device.get("readme")
+                if "selection" in device.get("param", {}):
+                    item["selection"] = device["param"]["selection"]
+                schema.append(item)
+                if device_id not in trig_ids:
+                    state.append({"id": device_id, "param": {"present": device.get("param", {}).get("present")}})
+            return (
+                _dumps({"status": "init", "init_param": init_param, "devices": schema}),
+                _dumps({"status": "update", "devices": state}),
+            )
+
+        schema, state = render()
+        fixed = estimate_tokens(compact_trigger)
+        for device_id in reversed(selected):
+            if estimate_tokens(schema) + estimate_tokens(state) + fixed <= self._budget:
+                break
+            if device_id not in trig_ids:
+                readme[device_id] = False
+                schema, state = render()
+        while estimate_tokens(schema) + estimate_tokens(state) + fixed > self._budget:
+            removable = [device_id for device_id in selected if device_id not in trig_ids]
+            if not removable:
+                break
+            selected.remove(removable[-1])
+            schema, state = render()
+        return schema, state, compact_trigger
+
+
+__all__ = ["ContextBuilder", "estimate_tokens"]
@@ -0,0 +1,109 @@
+import json
+import threading
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+def _schema(device):
+    """ 设备的静态部分：除 present 以外的全部字段 """
+    schema = {key: value for key, value in device.items() if key != "param"}
+    schema["selection"] = device.get("param", {}).get("selection")
+    return schema
+
+
+class PromptLayout:
+    """
+    便于服务端前缀缓存的消息布局.
+    系统提示与设备数据（含某一时刻的状态基线）放在消息前部，序列化结果逐字节稳定；
+    之后的状态变化只以 "update" 增量的形式放在触发数据之前。
+    变化的设备超过 rebase_ratio 比例或设备结构改变时，重新生成基线。
+    提供 ContextBuilder 时改为按触发裁剪设备上下文，相同的设备组合得到相同的前缀。
+    """
+    def __init__(self, tips, rebase_ratio=0.5, context=None):
+        """
+        :param tips: 系统提示
+        :param rebase_ratio: 触发重新生成基线的变化设备比例
+        :param context: ContextBuilder 实例，为 None 时发送全部设备
+        """
+        self._tips = tips
+        self._rebase_ratio = rebase_ratio
+        self._context = context
+        self._config = {}
+        self._lock = threading.Lock()
+        self._schema = None
+        self._structure = None
+        self._stable = ""
+        self._baseline = {}
+        self._present = {}
+
+    def set_state(self, config, structure=None):
+        """
+        :param config: 完整的设备配置，结构与 all_device_config 相同，之后不应再被修改
+        :param structure: 设备结构的版本号，与上次相同时不再序列化设备的静态部分
+        """
+        devices = config.get("devices", [])
+        if structure is not None and structure == self._structure:
+            schema = self._schema
+        else:
+            schema = _dumps({
+                "init_param": config.get("init_param", {}),
+                "devices": [_schema(device) for device in devices],
+            })
+        present = {device["id"]: device.get("param", {}).get("present", {}) for device in devices}
+        with self._lock:
+            changed = sum(1 for device_id, value in present.items() if self._baseline.get(device_id) != value)
+            self._structure = structure
+            if schema != self._schema or changed > self._rebase_ratio * max(len(present), 1):
+                self._schema = schema
+                self._stable = _dumps(dict(config, status="init"))
+                self._baseline = present
+            self._present = present
+            self._config = config
+
+    def _delta_locked(self):
+        devices = [
+            {"id": device_id, "param": {"present": value}}
+            for device_id, value in self._present.items()
+            if self._baseline.get(device_id) != value
+        ]
+        if not devices:
+            return None
+        return _dumps({"status": "update", "devices": devices})
+
+    def messages(self, trigger):
+        """
+        :param trigger: 触发数据 JSON 字符串
+        :return: 发送给 LLM 的消息列表
+        """
+        if self._context is not None:
+            with self._lock:
+                config = self._config
+            schema, state, trigger = self._context.build(config.get("devices", []), config.get("init_param", {}), trigger)
+            return [
+                {"role": "system", "content": self._tips},
+                {"role": "user", "content": schema},
+                {"role": "assistant", "content": ""},
+                {"role": "user", "content": state},
+                {"role": "assistant", "content": ""},
+                {"role": "user", "content": trigger},
+                {"role": "assistant", "content": "```json\n", "prefix": True},
+            ]
+        with self._lock:
+            stable = self._stable
+            delta = self._delta_locked()
+        messages = [
+            {"role": "system", "content": self._tips},
+            {"role": "user", "content": stable},
+            {"role": "assistant", "content": ""},
+        ]
+        if delta is not None:
+            messages.append({"role": "user", "content": delta})
+            messages.append({"role": "assistant", "content": ""})
+        messages.append({"role": "user", "content": trigger})
+        messages.append({"role": "assistant", "content": "```json\n", "prefix": True})
+        return messages
+
+
+__all__ = ["PromptLayout"]
@@ -0,0 +1,70 @@
+import json
+
+
+class ActionStreamParser:
+    """
+    增量解析 LLM 流式输出中的 actions 数组.
+    每次 feed 传入新到达的文本，返回其中已完整的动作对象，
+    不需要等待整个 JSON 生成完毕。
+    """
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key = None
+        self._actions_depth = None
+        self._action_start = None
+
+    def feed(self, text):
+        """
+        :param text: 新到达的文本片段
+        :return: 本次解析出的完整动作列表
+        """
+        self._buffer += text
+        actions = []
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = buffer[self._string_start + 1:i]
+                continue
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                self._depth += 1
+                if char == "[" and self._depth == 2 and self._last_key == "actions":
+                    self._actions_depth = self._depth
+                elif char == "{" and self._actions_depth is not None and self._depth == self._actions_depth + 1:
+                    self._action_start = i
+            elif char in "}]":
+                if char == "}" and self._action_start is not None and self._depth == self._actions_depth + 1:
+                    try:
+                        actions.append(json.loads(buffer[self._action_start:i + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                    self._action_start = None
+                elif char == "]" and self._depth == self._actions_depth:
+                    self._actions_depth = None
+                self._depth -= 1
+            elif char == ",":
+                if self._depth == 1:
+                    self._last_key = None
+        self._pos = len(buffer)
+        return actions
+
+    def text(self):
+        return self._buffer
+
+
+__all__ = ["ActionStreamParser"]
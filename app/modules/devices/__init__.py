@@ -1,24 +1,146 @@
 import os
+import ast
+import sys
 import glob
+import time
+import threading
 import importlib
+import importlib.util
+from collections.abc import Mapping
 
-# 发现所有设备模块
-module_files = glob.glob(os.path.join(os.path.dirname(__file__), "*.py"))
-module_names = [os.path.basename(f)[:-3] for f in module_files if f.endswith(".py") and f != "__init__.py"]
+import toml
 
-# 存储所有设备的 `Device` 类
-device_classes = {}
+from modules import sim
 
-for module in module_names:
+
+def _read_manifest(path):
+    """ 从模块源码中读取 MANIFEST 字面量，不导入模块 """
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(target, ast.Name) and target.id == "MANIFEST" for target in node.targets):
+            return ast.literal_eval(node.value)
+    return {}
+
+
+def _missing_requirements(requires):
+    missing = []
+    for name in requires:
+        try:
+            if importlib.util.find_spec(name) is None:
+                missing.append(name)
+        except (ImportError, ValueError):
+            missing.append(name)
+    return missing
+
+
+def _enabled_flags():
+    """ config.toml 中 [devices] 的启用开关，未列出的设备默认启用 """
     try:
-        mod = importlib.import_module(f"modules.devices.{module}")
-    except ImportError as e:
-        print(f"Error importing module {module}: {e}")
-        continue
+        with open(os.getcwd() + "/source/config.toml", "r", encoding="utf-8") as f:
+            return toml.load(f).get("devices", {})
+    except (OSError, toml.TomlDecodeError):
+        return {}
+
+
+def discover():
+    """
+    读取所有设备模块的清单.
+    :return: {模块名: 清单}，清单中附加 enabled、missing 与 available 字段
+    """
+    flags = _enabled_flags()
+    manifests = {}
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(__file__), "*.py"))):
+        module = os.path.basename(path)[:-3]
+        if module == "__init__":
+            continue
+        try:
+            manifest = dict(_read_manifest(path))
+        except (SyntaxError, ValueError) as e:
+            print(f"Error reading manifest of {module}: {e}")
+            continue
+        manifest.setdefault("name", module)
+        manifest.setdefault("requires", [])
+        manifest["enabled"] = bool(flags.get(module, True))
+        manifest["missing"] = _missing_requirements(manifest["requires"]) if manifest["enabled"] else []
+        manifest["available"] = manifest["enabled"] and not manifest["missing"]
+        manifests[module] = manifest
+    return manifests
+
+
+class DeviceRegistry(Mapping):
+    """
+    设备模块名到 `Device` 类的映射.
+    只包含已启用且依赖齐全的设备，模块在第一次取用其 `Device` 类时才导入，
+    导入耗时与新增加载的模块数记录在导入报告中。
+    """
+    def __init__(self, manifests):
+        self.manifests = manifests
+        self._names = [module for module, manifest in manifests.items() if manifest["available"]]
+        self._classes = {}
+        self._report = {}
+        # 设备在线程池中并发构造，导入串行进行，使每个模块的耗时与新增模块数只包含它自己的导入
+        self._import_lock = threading.Lock()
+
+    def __getitem__(self, module):
+        if module not in self._names:
+            raise KeyError(module)
+        with self._import_lock:
+            if module in self._classes:
+                return self._classes[module]
+            loaded = len(sys.modules)
+            start = time.perf_counter()
+            try:
+                mod = importlib.import_module(f"modules.devices.{module}")
+            except ImportError as e:
+                self._report[module] = {"seconds": time.perf_counter() - start, "modules": len(sys.modules) - loaded, "error": str(e)}
+                raise
+            self._report[module] = {"seconds": time.perf_counter() - start, "modules": len(sys.modules) - loaded, "error": None}
+            self._classes[module] = getattr(mod, "Device")
+            return self._classes[module]
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def import_report(self):
+        """ 每个设备模块的导入情况，未导入的模块注明原因 """
+        report = {}
+        for module, manifest in self.manifests.items():
+            if not manifest["enabled"]:
+                report[module] = {"status": "disabled"}
+            elif manifest["missing"]:
+                report[module] = {"status": "missing", "missing": manifest["missing"]}
+            elif module in self._report:
+                entry = self._report[module]
+                report[module] = dict(entry, status="error" if entry["error"] else "imported")
+            else:
+                report[module] = {"status": "pending"}
+        return report
+
+    def format_report(self):
+        lines = ["设备模块导入报告:"]
+        for module, entry in self.import_report().items():
+            if entry["status"] in ("imported", "error"):
+                detail = f"{entry['seconds'] * 1000:8.1f} ms, {entry['modules']:4d} modules"
+                if entry["error"]:
+                    detail += f", {entry['error']}"
+            elif entry["status"] == "missing":
+                detail = "missing " + ", ".join(entry["missing"])
+            else:
+                detail = ""
+            lines.append(f"  {module:<16}{entry['status']:<10}{detail}")
+        return "\n".join(lines)
+
+
+# 模拟模式下先替换硬件库，设备模块导入的即为模拟实现
+if sim.enabled():
+    sim.install()
 
-    # 获取模块中的 `Device` 类
-    if hasattr(mod, "Device"):
-        device_classes[module] = getattr(mod, "Device")  # 设备名 -> 设备类
+# 存储所有设备的 `Device` 类，按需导入
+device_classes = DeviceRegistry(discover())
 
 # 让 `from modules.devices import *` 可用
-__all__ = ["device_classes"]
+__all__ = ["device_classes", "discover", "DeviceRegistry"]
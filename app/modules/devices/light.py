@@ -1,11 +1,18 @@
 import os
-import copy
-import json
+import queue
 import threading
 import time
 
 from lightmodule.lightmodule import Light
 
+from modules.runtime import tracing
+
+MANIFEST = {
+    "name": "rgb_light",
+    "type": "light",
+    "requires": ["lightmodule"]
+}
+
 debug_value = os.environ.get('DEBUG')
 
 class Device:
@@ -33,45 +40,47 @@ class Device:
         self.trigger = False
         self.init_time = 0
         self.seed = "x38hdaxggaalglakgzqia69pijeg6p8s"
-        self._lock = True
+        self._commands = queue.Queue()
         if debug_value == 'False' or debug_value is None:
             self._light = Light(233, 71, 74)
         self._thread = threading.Thread(target=self.__run__, daemon=True)
         self._thread.start()
 
-    def unlock(self):
-        self._lock = False
+    def on_change(self, diff):
+        """ 由设备管理器在状态变化后调用，diff 为本次变化的字段，当前的 Trace 随命令交给驱动线程 """
+        self._commands.put((diff, tracing.current(), time.time()))
 
     def __run__(self):
-        while self._lock:
-            time.sleep(1)
-        last_present = copy.deepcopy(self.data["param"]["present"])
         try:
             while True:
+                # 没有变化时阻塞等待，连续的多次变化只执行最后的状态
+                commands = [self._commands.get()]
+                while not self._commands.empty():
+                    commands.append(self._commands.get_nowait())
                 if debug_value == 'True':
-                    time.sleep(1)
                     continue
                 current_present = self.data["param"]["present"]
-                if current_present != last_present:
-                    status = current_present.get("status")
-                    color = current_present.get("color_rgb", [0, 0, 0])
-                    if status == "on":
-                        self._light.turn_on(color[0], color[1], color[2])
-                    else:
-                        self._light.turn_off()
-                    last_present = copy.deepcopy(current_present)
-                time.sleep(1)
+                status = current_present.get("status")
+                color = current_present.get("color_rgb", [0, 0, 0])
+                with tracing.activate(trace for _, traces, _ in commands for trace in traces):
+                    tracing.record("light.queue", commands[0][2])
+                    with tracing.span("light.turn_on" if status == "on" else "light.turn_off"):
+                        if status == "on":
+                            self._light.turn_on(color[0], color[1], color[2])
+                        else:
+                            self._light.turn_off()
         except KeyboardInterrupt:
             pass
 
 
 if __name__ == "__main__":
     device = Device()
-    device.unlock()
     device.data["param"]["present"]["status"] = "on"
     device.data["param"]["present"]["color_rgb"] = [255, 255, 0]
+    device.on_change({"status": "on", "color_rgb": [255, 255, 0]})
     time.sleep(5)
     device.data["param"]["present"]["status"] = "off"
+    device.on_change({"status": "off"})
     time.sleep(1)
     print("done")
 
@@ -2,6 +2,15 @@ import time
 import threading
 from periphery import GPIO
 
+from modules.runtime.scheduler import get_scheduler
+from modules.runtime import tracing
+
+MANIFEST = {
+    "name": "door",
+    "type": "door",
+    "requires": ["periphery"]
+}
+
 class Electromagnet:
     def __init__(self, pin, gpiochip="/dev/gpiochip0"):
         """
@@ -81,29 +90,31 @@ class Device():
         }
         self.trigger = False
         self.init_time = 0
+        self.on_update = None
         self._magnet = Electromagnet(231)
-        self._thread = threading.Thread(target=self.__run__, daemon=True)
-        self._thread.start()
+        self._opened = threading.Lock()
 
-    def __run__(self):
-        run_time = 0
-        try:
-            while True:
-                if self.data["param"]["present"]["status"] == "opened":
-                    run_time += 1
-                if run_time > 15:
-                    self.data["param"]["present"]["status"] = "closed"
-                    run_time = 0
-                if self.data["param"]["present"]["status"] == "open" and run_time <= 15:
-                    self.data["param"]["present"]["status"] = "opened"
-                    print("open door")
-                    self._magnet.start(duration=15)
-                    run_time = 0
-                time.sleep(1)
-        except KeyboardInterrupt:
-            self._thread.join()
-        finally:
-            self._magnet.stop()
+    def on_change(self, diff):
+        """ 由设备管理器在状态变化后调用，diff 为本次变化的字段 """
+        if diff.get("status") != "open":
+            return
+        # 开门期间的重复开门命令不重新计时
+        if not self._opened.acquire(blocking=False):
+            return
+        self._set_status("opened")
+        print("open door")
+        with tracing.span("door.open"):
+            self._magnet.start(duration=15)
+        get_scheduler().call_later(15, self._close, name="door.close")
+
+    def _close(self):
+        self._set_status("closed")
+        self._opened.release()
+
+    def _set_status(self, status):
+        self.data["param"]["present"]["status"] = status
+        if self.on_update is not None:
+            self.on_update(self)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,16 @@
 import time
-import json
-import copy
+import queue
 import threading
 from periphery import GPIO
 
+from modules.runtime import tracing
+
+MANIFEST = {
+    "name": "draperies",
+    "type": "draperies",
+    "requires": ["periphery"]
+}
+
 class StepperMotorHalfStep:
     def __init__(self, pins, gpiochip="/dev/gpiochip0", steps_per_revolution=4096):
         """
@@ -163,29 +170,30 @@ class Device:
         self.trigger = False
         self.init_time = 0
         self.seed = "4rzrafg24od30xgw2azrigdzhlxlrrjm"
-        self._lock = True
+        self._commands = queue.Queue()
         self._motor = StepperMotorFullStep([70, 69, 72, 79])
         self._thread = threading.Thread(target=self.__run__, daemon=True)
         self._thread.start()
 
-    def unlock(self):
-        self._lock = False
+    def on_change(self, diff):
+        """ 由设备管理器在状态变化后调用，diff 为本次变化的字段，当前的 Trace 随命令交给驱动线程 """
+        self._commands.put((diff, tracing.current(), time.time()))
 
     def __run__(self):
-        while self._lock:
-            time.sleep(1)
-        data = copy.deepcopy(self.data)
         try:
             while True:
-                if json.dumps(self.data["param"]["present"], sort_keys=True) != json.dumps(data["param"]["present"], sort_keys=True):
-                    if self.data["param"]["present"]["status"] == "open":
-                        self._motor.stop()
-                        self._motor.rotate(rotations=5, speed_level=2, direction="cw")
-                    elif self.data["param"]["present"]["status"] == "closed":
-                        self._motor.stop()
-                        self._motor.rotate(rotations=5, speed_level=2, direction="ccw")
-                    data = copy.deepcopy(self.data)
-                time.sleep(1)
+                diff, traces, queued = self._commands.get()
+                if "status" not in diff:
+                    continue
+                with tracing.activate(traces):
+                    tracing.record("motor.queue", queued)
+                    with tracing.span("motor.rotate", status=diff["status"]):
+                        if diff["status"] == "open":
+                            self._motor.stop()
+                            self._motor.rotate(rotations=5, speed_level=2, direction="cw")
+                        elif diff["status"] == "closed":
+                            self._motor.stop()
+                            self._motor.rotate(rotations=5, speed_level=2, direction="ccw")
         except KeyboardInterrupt:
             self._thread.join()
 
@@ -1,10 +1,20 @@
 import os
 import time
-import threading
 import smbus2
 
+from modules.runtime.scheduler import get_scheduler
+from modules.runtime.metrics import histogram
+
+MANIFEST = {
+    "name": "multi_sensor",
+    "type": "sensor",
+    "requires": ["smbus2"]
+}
+
 debug_value = os.environ.get('DEBUG')
 
+_read_seconds = histogram("hi_sensor_read_seconds", "传感器单次读取耗时（秒），含等待转换的时间", ["sensor"])
+
 if debug_value == 'True':
     import random
 else:
@@ -20,55 +30,58 @@ else:
             self._i2c.write_i2c_block_data(self._sgp30_addr, self._sgp30_init_command[0], self._sgp30_init_command[1:])
 
         def bh1750_read(self):
-            try:
-                # 发送读取数据命令
-                self._i2c.write_byte(self._bh1750_addr, self._bh1750_one_time_high_res_mode)
-                time.sleep(0.2)  # 等待数据准备
-                # 读取 2 字节的数据
-                data = self._i2c.read_i2c_block_data(self._bh1750_addr, 0x00, 2)
-                # 解析光照度数据
-                light = (data[0] << 8) | data[1]
-                light /= 1.2
-                return "{:.2f}".format(light)
-            except Exception as e:
-                print(f"读取 BH1750 数据失败: {e}")
-                return None
+            with _read_seconds.labels("bh1750").time():
+                try:
+                    # 发送读取数据命令
+                    self._i2c.write_byte(self._bh1750_addr, self._bh1750_one_time_high_res_mode)
+                    time.sleep(0.2)  # 等待数据准备
+                    # 读取 2 字节的数据
+                    data = self._i2c.read_i2c_block_data(self._bh1750_addr, 0x00, 2)
+                    # 解析光照度数据
+                    light = (data[0] << 8) | data[1]
+                    light /= 1.2
+                    return "{:.2f}".format(light)
+                except Exception as e:
+                    print(f"读取 BH1750 数据失败: {e}")
+                    return None
             
         def aht10_read(self):
-            try:
-                # 发送读取数据命令
-                self._i2c.write_i2c_block_data(self._aht10_addr, 0xAC, [0x33, 0x00])
-                time.sleep(0.1)  # 等待数据准备
+            with _read_seconds.labels("aht10").time():
+                try:
+                    # 发送读取数据命令
+                    self._i2c.write_i2c_block_data(self._aht10_addr, 0xAC, [0x33, 0x00])
+                    time.sleep(0.1)  # 等待数据准备
 
-                # 读取 6 字节的数据
-                data = self._i2c.read_i2c_block_data(self._aht10_addr, 0x00, 6)
+                    # 读取 6 字节的数据
+                    data = self._i2c.read_i2c_block_data(self._aht10_addr, 0x00, 6)
 
-                # 解析温度和湿度数据
-                temperature = (((data[3] & 0x0F) << 16) | (data[4] << 8) | data[5]) * 200.0 / 1048576.0 - 50
-                humidity = ((data[1] << 12) | (data[2] << 4) | (data[3] >> 4)) * 100.0 / 1048576.0
+                    # 解析温度和湿度数据
+                    temperature = (((data[3] & 0x0F) << 16) | (data[4] << 8) | data[5]) * 200.0 / 1048576.0 - 50
+                    humidity = ((data[1] << 12) | (data[2] << 4) | (data[3] >> 4)) * 100.0 / 1048576.0
 
-                return "{:.2f}".format(temperature), "{:.2f}".format(humidity)
-            except Exception as e:
-                print(f"读取 AHT10 数据失败: {e}")
-                return None
+                    return "{:.2f}".format(temperature), "{:.2f}".format(humidity)
+                except Exception as e:
+                    print(f"读取 AHT10 数据失败: {e}")
+                    return None
             
         def sgp30_read(self):
-            try:
-                # 发送读取数据命令
-                self._i2c.write_i2c_block_data(self._sgp30_addr, self._sgp30_read_command[0], self._sgp30_read_command[1:])
-                time.sleep(0.1)  # 等待数据准备
+            with _read_seconds.labels("sgp30").time():
+                try:
+                    # 发送读取数据命令
+                    self._i2c.write_i2c_block_data(self._sgp30_addr, self._sgp30_read_command[0], self._sgp30_read_command[1:])
+                    time.sleep(0.1)  # 等待数据准备
 
-                # 读取 6 字节的数据
-                data = self._i2c.read_i2c_block_data(self._sgp30_addr, 0x00, 6)
+                    # 读取 6 字节的数据
+                    data = self._i2c.read_i2c_block_data(self._sgp30_addr, 0x00, 6)
 
-                # 解析 CO2 和 TVOC 数据
-                co2 = (data[0] << 8) | data[1]  # CO2 数据
-                tvoc = (data[3] << 8) | data[4]  # TVOC 数据
+                    # 解析 CO2 和 TVOC 数据
+                    co2 = (data[0] << 8) | data[1]  # CO2 数据
+                    tvoc = (data[3] << 8) | data[4]  # TVOC 数据
 
-                return co2, tvoc
-            except Exception as e:
-                print(f"读取 SGP30 数据失败: {e}")
-                return None, None
+                    return co2, tvoc
+                except Exception as e:
+                    print(f"读取 SGP30 数据失败: {e}")
+                    return None, None
 
 
 class Device():
@@ -109,145 +122,143 @@ class Device():
             "uuid": "7031be97-7758-4eec-9f77-06a83112554f"
         }
         self.trigger = False
+        self.on_trigger = None
+        self.on_update = None
         self.init_time = 0
         if debug_value == 'False' or debug_value is None:
             self._multi_sensor = Multi_Sensor()
-        self._thread = threading.Thread(target=self.__run__, daemon=True)
-        self._thread.start()
-        
-
-    def __run__(self):
-        # 初始化记录上一次状态及上次触发报警时间
+        # 记录上一次状态及上次触发报警时间
         # 这里定义状态分为三档："normal" 正常，"abnormal1" 异常一级，"abnormal2" 异常二级
-        prev_co2_level = "normal"
-        prev_tvoc_level = "normal"
-        prev_temperature_level = "normal"
-        prev_humidity_level = "normal"
-        last_trigger_time_co2 = time.time()
-        last_trigger_time_tvoc = time.time()
-        last_trigger_time_temperature = time.time()
-        last_trigger_time_humidity = time.time()
-        message_foot = " not at normal value"
+        self._prev_level = {"co2": "normal", "tvoc": "normal", "temperature": "normal", "humidity": "normal"}
+        self._last_trigger_time = {key: time.time() for key in self._prev_level}
+        self._job = get_scheduler().call_every(1, self._sample, name="multi_sensor.sample")
+
+    def _fire(self):
+        """ 标记触发并立即通知设备管理器 """
+        self.trigger = True
+        if self.on_trigger is not None:
+            self.on_trigger(self)
+
+    def _sample(self):
+        """ 由调度器每秒调用一次，读取传感器并判断是否需要触发 """
         abnormal_value = []
+        triggered = False
+        message_foot = " not at normal value"
+        self.data["param"]["present"]["message"] = ""
+        if debug_value == 'True':
+            co2, tvoc = random.randint(380,450), random.randint(0,10)
+            light = random.randint(0,1000)
+            temperature, humidity = random.randint(25,28), random.randint(60,70)
+        else:
+            co2, tvoc = self._multi_sensor.sgp30_read()
+            light = float(self._multi_sensor.bh1750_read())
+            temperature, humidity = float(self._multi_sensor.aht10_read()[0]), float(self._multi_sensor.aht10_read()[1])
+        self.data["param"]["present"]["co2"]["content"] = co2 if co2 is not None else 0
+        self.data["param"]["present"]["tvoc"]["content"] = tvoc if tvoc is not None else 0
+        self.data["param"]["present"]["light"]["content"] = light if light is not None else 0
+        self.data["param"]["present"]["temperature"]["content"] = temperature if temperature is not None else 25
+        self.data["param"]["present"]["humidity"]["content"] = humidity if humidity is not None else 70
+        current_time = time.time()
 
-        while True:
-            abnormal_value.clear()
-            self.data["param"]["present"]["message"] = ""
-            try:
-                if debug_value == 'True':
-                    co2, tvoc = random.randint(380,450), random.randint(0,10)
-                    light = random.randint(0,1000)
-                    temperature, humidity = random.randint(25,28), random.randint(60,70)
-                else:
-                    co2, tvoc = self._multi_sensor.sgp30_read()
-                    light = float(self._multi_sensor.bh1750_read())
-                    temperature, humidity = float(self._multi_sensor.aht10_read()[0]), float(self._multi_sensor.aht10_read()[1])
-                self.data["param"]["present"]["co2"]["content"] = co2 if co2 is not None else 0
-                self.data["param"]["present"]["tvoc"]["content"] = tvoc if tvoc is not None else 0
-                self.data["param"]["present"]["light"]["content"] = light if light is not None else 0
-                self.data["param"]["present"]["temperature"]["content"] = temperature if temperature is not None else 25
-                self.data["param"]["present"]["humidity"]["content"] = humidity if humidity is not None else 70
-                current_time = time.time()
+        # 根据预设阈值判断 CO2 状态（可根据实际情况调整）
+        if co2 < 1000:
+            current_co2_level = "normal"
+        elif co2 < 1500:
+            current_co2_level = "abnormal1"
+            abnormal_value.append("CO2")
+        else:
+            current_co2_level = "abnormal2"
+            abnormal_value.append("CO2")
 
-                # 根据预设阈值判断 CO2 状态（可根据实际情况调整）
-                if co2 < 1000:
-                    current_co2_level = "normal"
-                elif co2 < 1500:
-                    current_co2_level = "abnormal1"
-                    abnormal_value.append("CO2")
-                else:
-                    current_co2_level = "abnormal2"
-                    abnormal_value.append("CO2")
+        # 根据预设阈值判断 TVOC 状态（可根据实际情况调整）
+        if tvoc < 500:
+            current_tvoc_level = "normal"
+        elif tvoc < 1000:
+            current_tvoc_level = "abnormal1"
+            abnormal_value.append("TVOC")
+        else:
+            current_tvoc_level = "abnormal2"
+            abnormal_value.append("TVOC")
 
-                # 根据预设阈值判断 TVOC 状态（可根据实际情况调整）
-                if tvoc < 500:
-                    current_tvoc_level = "normal"
-                elif tvoc < 1000:
-                    current_tvoc_level = "abnormal1"
-                    abnormal_value.append("TVOC")
-                else:
-                    current_tvoc_level = "abnormal2"
-                    abnormal_value.append("TVOC")
+        # 根据预设阈值判断 Temperature 状态（可根据实际情况调整）
+        if temperature < 18:
+            current_temperature_level = "cold" 
+            abnormal_value.append("temperature")
+        elif 18 <= temperature < 30:
+            current_temperature_level = "normal"
+        else:
+            current_temperature_level = "hot"
+            abnormal_value.append("temperature")
 
-                # 根据预设阈值判断 Temperature 状态（可根据实际情况调整）
-                if temperature < 18:
-                    current_temperature_level = "cold" 
-                    abnormal_value.append("temperature")
-                elif 18 <= temperature < 30:
-                    current_temperature_level = "normal"
-                else:
-                    current_temperature_level = "hot"
-                    abnormal_value.append("temperature")
+        # 根据预设阈值判断 Humidity 状态（可根据实际情况调整）
+        if humidity < 50:
+            current_humidity_level = "dry"
+            abnormal_value.append("humidity")
+        elif 50 <= humidity <= 80:
+            current_humidity_level = "normal"
+        else:
+            current_humidity_level = "wet"
+            abnormal_value.append("humidity")
 
-                # 根据预设阈值判断 Humidity 状态（可根据实际情况调整）
-                if humidity < 50:
-                    current_humidity_level = "dry"
-                    abnormal_value.append("humidity")
-                elif 50 <= humidity <= 80:
-                    current_humidity_level = "normal"
-                else:
-                    current_humidity_level = "wet"
-                    abnormal_value.append("humidity")
+        if abnormal_value != []:
+            message_body = " and ".join(abnormal_value)
+            self.data["param"]["present"]["message"] = message_body + message_foot
 
-                if abnormal_value != []:
-                    message_body_tmp = ""
-                    for item in abnormal_value:
-                        message_body_tmp = message_body_tmp + item + " and "
-                    message_body = message_body_tmp[:-5]
-                    del message_body_tmp
-                    self.data["param"]["present"]["message"] = message_body + message_foot
+        if self.on_update is not None:
+            self.on_update(self)
 
-                # ----- CO2 逻辑 -----
-                # 情况1：从正常进入异常
-                if prev_co2_level == "normal" and current_co2_level != "normal":
-                    self.trigger = True
-                    last_trigger_time_co2 = current_time
-                # 情况2：在异常状态下进一步升高一级（例如从 abnormal1 升至 abnormal2）
-                elif prev_co2_level == "abnormal1" and current_co2_level == "abnormal2":
-                    self.trigger = True
-                    last_trigger_time_co2 = current_time
-                # 情况3：持续异常，每隔一分钟触发一次
-                elif current_co2_level != "normal" and (current_time - last_trigger_time_co2 >= 60):
-                    self.trigger = True
-                    last_trigger_time_co2 = current_time
+        prev = self._prev_level
+        last = self._last_trigger_time
 
-                # ----- TVOC 逻辑 -----
-                if prev_tvoc_level == "normal" and current_tvoc_level != "normal":
-                    self.trigger = True
-                    last_trigger_time_tvoc = current_time
-                elif prev_tvoc_level == "abnormal1" and current_tvoc_level == "abnormal2":
-                    self.trigger = True
-                    last_trigger_time_tvoc = current_time
-                elif current_tvoc_level != "normal" and (current_time - last_trigger_time_tvoc >= 60):
-                    self.trigger = True
-                    last_trigger_time_tvoc = current_time
+        # ----- CO2 逻辑 -----
+        # 情况1：从正常进入异常
+        if prev["co2"] == "normal" and current_co2_level != "normal":
+            triggered = True
+            last["co2"] = current_time
+        # 情况2：在异常状态下进一步升高一级（例如从 abnormal1 升至 abnormal2）
+        elif prev["co2"] == "abnormal1" and current_co2_level == "abnormal2":
+            triggered = True
+            last["co2"] = current_time
+        # 情况3：持续异常，每隔一分钟触发一次
+        elif current_co2_level != "normal" and (current_time - last["co2"] >= 60):
+            triggered = True
+            last["co2"] = current_time
 
-                # ----- Temperature 逻辑 ----
-                if prev_temperature_level == "normal" and current_temperature_level != "normal":
-                    self.trigger = True
-                    last_trigger_time_temperature = current_time
-                elif current_temperature_level != "normal" and (current_time - last_trigger_time_temperature >= 60):
-                    self.trigger = True
-                    last_trigger_time_temperature = current_time
+        # ----- TVOC 逻辑 -----
+        if prev["tvoc"] == "normal" and current_tvoc_level != "normal":
+            triggered = True
+            last["tvoc"] = current_time
+        elif prev["tvoc"] == "abnormal1" and current_tvoc_level == "abnormal2":
+            triggered = True
+            last["tvoc"] = current_time
+        elif current_tvoc_level != "normal" and (current_time - last["tvoc"] >= 60):
+            triggered = True
+            last["tvoc"] = current_time
 
-                # ----- Humidity 逻辑 -----
-                if prev_humidity_level == "normal" and current_humidity_level != "normal":
-                    self.trigger = True
-                    last_trigger_time_humidity = current_time
-                elif current_humidity_level != "normal" and (current_time - last_trigger_time_humidity >= 60):
-                    self.trigger = True
-                    last_trigger_time_humidity = current_time
+        # ----- Temperature 逻辑 ----
+        if prev["temperature"] == "normal" and current_temperature_level != "normal":
+            triggered = True
+            last["temperature"] = current_time
+        elif current_temperature_level != "normal" and (current_time - last["temperature"] >= 60):
+            triggered = True
+            last["temperature"] = current_time
 
-                # 更新上一次的状态
-                prev_co2_level = current_co2_level
-                prev_tvoc_level = current_tvoc_level
-                prev_temperature_level = current_temperature_level
-                prev_humidity_level = current_humidity_level
+        # ----- Humidity 逻辑 -----
+        if prev["humidity"] == "normal" and current_humidity_level != "normal":
+            triggered = True
+            last["humidity"] = current_time
+        elif current_humidity_level != "normal" and (current_time - last["humidity"] >= 60):
+            triggered = True
+            last["humidity"] = current_time
 
-                time.sleep(1)
-            except KeyboardInterrupt:
-                break
+        if triggered:
+            self._fire()
 
+        # 更新上一次的状态
+        prev["co2"] = current_co2_level
+        prev["tvoc"] = current_tvoc_level
+        prev["temperature"] = current_temperature_level
+        prev["humidity"] = current_humidity_level
 
 if __name__ == "__main__":
     multi_sensor = Multi_Sensor()
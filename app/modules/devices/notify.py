@@ -1,10 +1,22 @@
-import threading
 import time
+import queue
+import threading
 import sounddevice as sd
 import soundfile as sf
 from gtts import gTTS
 from io import BytesIO
 
+from modules.runtime.metrics import histogram
+from modules.runtime import tracing
+
+MANIFEST = {
+    "name": "notify",
+    "type": "virtual_out",
+    "requires": ["sounddevice", "soundfile", "gtts"]
+}
+
+_synthesis_seconds = histogram("hi_tts_synthesis_seconds", "gTTS 语音合成耗时（秒）")
+
 class Notify:
     def __init__(self):
         # 播放控制
@@ -13,12 +25,13 @@ class Notify:
 
     def speech(self, message):
         """ 使用 gTTS 生成音频并播放 """
-        # 生成语音
-        tts = gTTS(text=message, lang='zh')
-        
-        # 将音频保存到内存中（无需保存为文件）
-        audio_stream = BytesIO()
-        tts.write_to_fp(audio_stream)
+        with _synthesis_seconds.time():
+            # 生成语音
+            tts = gTTS(text=message, lang='zh')
+
+            # 将音频保存到内存中（无需保存为文件）
+            audio_stream = BytesIO()
+            tts.write_to_fp(audio_stream)
         audio_stream.seek(0)  # 返回到文件开头
 
         # 读取音频数据
@@ -68,17 +81,26 @@ class Device():
         }
         self.trigger = False
         self.init_time = 0
+        self._commands = queue.Queue()
         self._notify = Notify()
         self._thread = threading.Thread(target=self.__run__, daemon=True)
         self._thread.start()
 
+    def on_change(self, diff):
+        """ 由设备管理器在状态变化后调用，diff 为本次变化的字段，当前的 Trace 随命令交给驱动线程 """
+        self._commands.put((diff, tracing.current(), time.time()))
+
     def __run__(self):
         while True:
-            if self.data["param"]["present"]["message"] != "":
-                self._notify.stop()
-                self._notify.speech(self.data["param"]["present"]["message"])
+            diff, traces, queued = self._commands.get()
+            message = diff.get("message", "")
+            if message != "":
+                with tracing.activate(traces):
+                    tracing.record("notify.queue", queued)
+                    with tracing.span("notify.speech"):
+                        self._notify.stop()
+                        self._notify.speech(message)
                 self.data["param"]["present"]["message"] = ""
-            time.sleep(1)
 
 if __name__ == "__main__":
     notify = Notify()
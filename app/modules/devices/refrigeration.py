@@ -1,9 +1,16 @@
 import time
-import copy
-import json
+import queue
 import threading
 from periphery import Serial
 
+from modules.runtime import tracing
+
+MANIFEST = {
+    "name": "refrigeration",
+    "type": "refrigeration",
+    "requires": ["periphery"]
+}
+
 
 class Refrigeration:
     def __init__(self, brand, serial_port="/dev/ttyS5"):
@@ -126,26 +133,28 @@ class Device:
         self.trigger = False
         self.init_time = 0
         self.seed = "fzt8so0xx3hv1ib87zluixu8td7koktk"
-        self._lock = True
+        self._commands = queue.Queue()
         self._refrigeration = Refrigeration(brand="gree")
         self._thread = threading.Thread(target=self.__run__, daemon=True)
         self._thread.start()
 
-    def unlock(self):
-        self._lock = False
+    def on_change(self, diff):
+        """ 由设备管理器在状态变化后调用，diff 为本次变化的字段，当前的 Trace 随命令交给驱动线程 """
+        self._commands.put((diff, tracing.current(), time.time()))
 
     def __run__(self):
-        while self._lock:
-            time.sleep(1)
-            data = copy.deepcopy(self.data)
-            try:
-                while True:
-                    if json.dumps(self.data["param"]["present"], sort_keys=True) != json.dumps(data["param"]["present"], sort_keys=True):
+        try:
+            while True:
+                # 每次发送完整状态，连续的多次变化只发送一次
+                commands = [self._commands.get()]
+                while not self._commands.empty():
+                    commands.append(self._commands.get_nowait())
+                with tracing.activate(trace for _, traces, _ in commands for trace in traces):
+                    tracing.record("refrigeration.queue", commands[0][2])
+                    with tracing.span("refrigeration.control"):
                         self._refrigeration.control(self.data["param"]["present"])
-                        data = copy.deepcopy(self.data)
-                    time.sleep(1)
-            except KeyboardInterrupt:
-                self._thread.join()
+        except KeyboardInterrupt:
+            self._thread.join()
 
 
 if __name__ == "__main__":
@@ -4,9 +4,19 @@ import time
 import zipfile
 import requests
 import shutil
-import threading
 from ultralytics import YOLO
 
+from modules.runtime.scheduler import get_scheduler
+from modules.runtime.metrics import histogram
+
+MANIFEST = {
+    "name": "smartcam",
+    "type": "virtual_in",
+    "requires": ["cv2", "requests", "ultralytics"]
+}
+
+_inference_seconds = histogram("hi_yolo_inference_seconds", "YOLO 单帧推理耗时（秒）")
+
 class SmartCam:
     def __init__(self):
         self._cap = cv2.VideoCapture("/dev/video1", cv2.CAP_V4L2)
@@ -38,48 +48,38 @@ class SmartCam:
             "fire": time.time()
         }
         self._model = YOLO(model=str(model_path), task="detect")
-        self._thread = threading.Thread(target=self._get_image, daemon=True)
-        self._thread.start()
-
+        self._job = get_scheduler().call_every(1 / 0.2, self._get_image, name="smartcam.detect")
 
-    def _get_image(self, fps=0.2):
-        width, height = 640, 480
-        device = "/dev/video1"
-        while True:
-            try:
-                _, self._frame = self._cap.read()
-                time.sleep(1 / fps)
-                if self._frame is None:
-                    continue
-                self._complete = True
-                results = self._model(self._frame)
-                person_count = 0
-                fire_count = 0
-                for result in results:
-                    if hasattr(result, "boxes") and result.boxes is not None:
-                        for cls in result.boxes.cls.cpu().numpy():
-                            label = self._model.names[int(cls)]                       
-                            if label.lower() == "person":
-                                person_count += 1
-                            elif label.lower() == "fire":
-                                fire_count += 1
-                self._detect_last["person"] = person_count
-                self._detect_last["fire"] = fire_count
-
-            except Exception as e:
-                print(e)
-                time.sleep(1)
+    def _get_image(self):
+        """ 由调度器每 5 秒调用一次，读取一帧并检测 """
+        _, self._frame = self._cap.read()
+        if self._frame is None:
+            return
+        with _inference_seconds.time():
+            results = self._model(self._frame)
+        person_count = 0
+        fire_count = 0
+        for result in results:
+            if hasattr(result, "boxes") and result.boxes is not None:
+                for cls in result.boxes.cls.cpu().numpy():
+                    label = self._model.names[int(cls)]                       
+                    if label.lower() == "person":
+                        person_count += 1
+                    elif label.lower() == "fire":
+                        fire_count += 1
+        self._detect_last["person"] = person_count
+        self._detect_last["fire"] = fire_count
+        self._complete = True
 
     def _init_data(self):
-        while not self._complete:
-            time.sleep(1)
-        self._detect_old["person"] = self._detect_last["person"]
-        self._detect_old["fire"] = self._detect_last["fire"]
-        self._inited = True
+        """ 第一帧检测完成后记录初始状态，返回是否已初始化 """
+        if not self._inited and self._complete:
+            self._detect_old["person"] = self._detect_last["person"]
+            self._detect_old["fire"] = self._detect_last["fire"]
+            self._inited = True
+        return self._inited
 
     def check_person(self, waittime=60):
-        while not self._inited:
-            time.sleep(1)
         current_time = time.time()
         if self._detect_old["person"] > 0 and self._detect_last["person"] == 0:
             if current_time - self._detect_time_old["person"] > waittime:
@@ -103,8 +103,6 @@ class SmartCam:
 
 
     def check_fire(self, waittime=60):
-        while not self._inited:
-            time.sleep(1)
         current_time = time.time()
         if self._detect_old["fire"] == 0 and self._detect_last["fire"] > 0:
             if current_time - self._detect_time_old["fire"] > waittime:
@@ -130,28 +128,36 @@ class Device:
             "uuid": "012f3cda-9fa3-4d8b-8194-081e2671491f"
         }
         self.trigger = False
+        self.on_trigger = None
         self.init_time = 0
         self._smartcam = SmartCam()
-        self._thread = threading.Thread(target=self.__run__, daemon=True)
-        self._thread.start()
-
-    def __run__(self):
-        while True:
-            person_status = self._smartcam.check_person()
-            fire_status = self._smartcam.check_fire()
-            if person_status == "left":
-                self.data["param"]["present"]["message"] = "Person left"
-                self.trigger = True
-            if person_status == "enter":
-                self.data["param"]["present"]["message"] = "Person enter"
-                self.trigger = True
-            if person_status == "stay":
-                self.data["param"]["present"]["message"] = "Person inside"
-            if person_status == "none":
-                self.data["param"]["present"]["message"] = "No person"
-            if fire_status == True:
-                self.data["param"]["present"]["message"] = "Burning fire"
-                self.trigger = True
-            time.sleep(1)
+        self._job = get_scheduler().call_every(1, self._check, name="smartcam.check")
 
+    def _fire(self):
+        """ 标记触发并立即通知设备管理器 """
+        self.trigger = True
+        if self.on_trigger is not None:
+            self.on_trigger(self)
 
+    def _check(self):
+        """ 由调度器每秒调用一次，第一帧检测完成前不做判断 """
+        if not self._smartcam._init_data():
+            return
+        person_status = self._smartcam.check_person()
+        fire_status = self._smartcam.check_fire()
+        triggered = False
+        if person_status == "left":
+            self.data["param"]["present"]["message"] = "Person left"
+            triggered = True
+        if person_status == "enter":
+            self.data["param"]["present"]["message"] = "Person enter"
+            triggered = True
+        if person_status == "stay":
+            self.data["param"]["present"]["message"] = "Person inside"
+        if person_status == "none":
+            self.data["param"]["present"]["message"] = "No person"
+        if fire_status == True:
+            self.data["param"]["present"]["message"] = "Burning fire"
+            triggered = True
+        if triggered:
+            self._fire()
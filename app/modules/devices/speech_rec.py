@@ -1,11 +1,14 @@
-import time
-import threading
+MANIFEST = {
+    "name": "speech_recognation",
+    "type": "virtual_in",
+    "requires": []
+}
 
 
 class SpeechRec():
     def __init__(self):
-        self.speeched = False
-        pass
+        # 识别出一段语音后以文本调用 on_text
+        self.on_text = None
     
     def get_text(self):
         pass
@@ -32,22 +35,26 @@ class Device():
         }
         self.special = True
         self.trigger = False
+        self.on_trigger = None
         self.init_time = 0
         self._speechrec = SpeechRec()
-        self._thread = threading.Thread(target=self.__run__)
-        self._thread.start()
+        self._speechrec.on_text = self._hear
+
+    def _hear(self, text):
+        """ 收到一段语音文本，写入 message 并立即触发 """
+        if not text:
+            return
+        self.data["param"]["present"]["message"] = text
+        self._fire()
+
+    def on_change(self, diff):
+        """ 通过 cmd 写入的 message 与语音输入一样立即触发 """
+        if diff.get("message"):
+            self._fire()
 
-    def __run__(self):
-        while True:
-            if self._speechrec.speeched:
-                self.data["param"]["present"]["message"] = self._speechrec.get_text()
-                self.trigger = True
-                while self.trigger:
-                    time.sleep(0.5)
-                self.data["param"]["present"]["message"] = ""
-            if self.data["param"]["present"]["message"] != "":
-                self.trigger = True
-                while self.trigger:
-                    time.sleep(0.5)
-                self.data["param"]["present"]["message"] = ""
-            time.sleep(1)
\ No newline at end of file
+    def _fire(self):
+        """ 标记触发并立即通知设备管理器，触发事件保存了数据快照，随后清空消息 """
+        self.trigger = True
+        if self.on_trigger is not None:
+            self.on_trigger(self)
+            self.data["param"]["present"]["message"] = ""
@@ -1,11 +1,17 @@
 import os
-import time
 import requests
-import threading
 import shutil
 import geoip2.database
 import toml
 
+from modules.runtime.scheduler import get_scheduler
+
+MANIFEST = {
+    "name": "weather_info",
+    "type": "virtual_in",
+    "requires": ["requests", "geoip2", "toml"]
+}
+
 
 class Weather():
     def __init__(self, api_key=None, api_base="https://api.caiyunapp.com"):
@@ -77,14 +83,20 @@ class Device():
             "uuid": "2c03700e-4765-4173-ba91-014baa55013e"
         }
         self.trigger = False
+        self.on_trigger = None
+        self.on_update = None
         self.init_time = 0
         self._weather = Weather()
         self.__get_weather__()
         self.data["param"]["present"]["city"] = self._weather.get_city()
         self._duration = 1.5
-        self._thread = threading.Thread(target=self.__run__, daemon=True)
-        self._stop_event = threading.Event()
-        self._thread.start()
+        self._job = get_scheduler().call_every(self._duration * 3600, self._refresh, name="weather.refresh")
+
+    def _fire(self):
+        """ 标记触发并立即通知设备管理器 """
+        self.trigger = True
+        if self.on_trigger is not None:
+            self.on_trigger(self)
 
     def __get_weather__(self):
         data = self._weather.get_weather_info()
@@ -96,15 +108,15 @@ class Device():
         self.data["param"]["present"]["humidity"] = data[3]
         self.data["param"]["present"]["wind_speed"] = data[4]
 
-    def __run__(self):
-        while True:
-            for _ in range(int(self._duration * 3600)):
-                self._stop_event.wait(1)
-                if self._stop_event.is_set():
-                    return
-                time.sleep(1)
-            self.__get_weather__()
-            self.trigger = True
+    def _refresh(self):
+        """ 由调度器每 _duration 小时调用一次 """
+        self.__get_weather__()
+        if self.on_update is not None:
+            self.on_update(self)
+        self._fire()
+
+    def stop(self):
+        self._job.cancel()
             
 
 
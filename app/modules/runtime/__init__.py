@@ -0,0 +1,13 @@
+from .storage import *
+from .events import *
+from .dispatcher import *
+from .rules import *
+from .snapshot import *
+from .bus import *
+from .state import *
+from .schema import *
+from .persist import *
+from .readiness import *
+from .scheduler import *
+from .metrics import *
+from .tracing import *
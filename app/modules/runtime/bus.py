@@ -0,0 +1,118 @@
+import time
+import threading
+from collections import deque
+
+
+class Subscription:
+    """
+    单个客户端的事件缓冲区.
+    缓冲区有上限，消费过慢时丢弃最旧的事件，并在下一次读取时先返回一个 reset 事件，
+    提示客户端重新获取完整状态。
+    """
+    def __init__(self, maxsize):
+        self._events = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._overflowed = False
+        self.last_version = 0
+
+    def put(self, event):
+        with self._cond:
+            if len(self._events) == self._events.maxlen:
+                self._overflowed = True
+            self._events.append(event)
+            self._cond.notify()
+
+    def reset(self, version):
+        with self._cond:
+            self._events.clear()
+            self._overflowed = True
+            self.last_version = version
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """
+        取出缓冲区中的全部事件，没有事件时最多等待 timeout 秒.
+        :return: 事件列表，超时返回空列表
+        """
+        with self._cond:
+            if not self._events and not self._overflowed:
+                self._cond.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            if self._overflowed:
+                self._overflowed = False
+                version = events[0]["version"] - 1 if events else self.last_version
+                events.insert(0, {"version": version, "kind": "reset", "id": None, "data": None, "time": time.time()})
+            if events:
+                self.last_version = events[-1]["version"]
+            return events
+
+
+class EventBus:
+    """
+    设备状态变化的发布/订阅.
+    每个事件带有单调递增的版本号，最近 history 条事件保留在内存中，
+    客户端凭最后收到的版本号续传；版本号早于保留范围或超过当前版本时收到 reset 事件。
+    """
+    def __init__(self, history=256, buffer_size=64):
+        """
+        :param history: 保留用于续传的事件数
+        :param buffer_size: 每个订阅者的缓冲区大小
+        """
+        self._history = deque(maxlen=history)
+        self._buffer_size = buffer_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._version = 0
+
+    @property
+    def version(self):
+        return self._version
+
+    def publish(self, kind, device_id, data):
+        """
+        :param kind: 事件类型，如 "state"、"sensor"、"trigger"
+        :param device_id: 设备 id
+        :param data: 事件内容，发布后不应再修改
+        :return: 事件的版本号
+        """
+        with self._lock:
+            self._version += 1
+            event = {"version": self._version, "kind": kind, "id": device_id, "data": data, "time": time.time()}
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(event)
+        return event["version"]
+
+    def subscribe(self, since=None):
+        """
+        :param since: 客户端最后收到的版本号，为 None 时只接收之后的新事件
+        """
+        with self._lock:
+            replay = None
+            if since is not None and since < self._version:
+                if self._history and since >= self._history[0]["version"] - 1:
+                    replay = [event for event in self._history if event["version"] > since]
+            # 续传的历史事件不受缓冲区上限约束，否则落后较多的客户端会被误判为溢出
+            subscription = Subscription(self._buffer_size + len(replay or ()))
+            subscription.last_version = self._version
+            if replay is not None:
+                for event in replay:
+                    subscription.put(event)
+            elif since is not None and since != self._version:
+                # 版本号过旧，或超过当前版本（重启后计数重新开始），客户端需重新获取完整状态
+                subscription.reset(self._version)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+__all__ = ["EventBus", "Subscription"]
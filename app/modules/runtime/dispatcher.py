@@ -0,0 +1,248 @@
+import json
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from . import tracing
+
+
+# 优先级从高到低
+PRIORITY_CLASSES = ("safety", "voice", "sensor", "info")
+
+# 按设备名称与设备类型的默认优先级，名称优先匹配
+DEFAULT_PRIORITY = {
+    "smartcam": "safety",
+    "speech_recognation": "voice",
+    "weather_info": "info",
+    "sensor": "sensor",
+}
+
+
+class _Batch:
+    def __init__(self, seq, priority, trig_events):
+        self.seq = seq
+        self.priority = priority
+        self.events = {}
+        self.traces = []
+        self.time = time.time()
+        self.cancelled = False
+        self.merge(seq, trig_events)
+
+    def merge(self, seq, trig_events):
+        """ 合并新事件，同一设备只保留最新的快照，被替换的事件的 Trace 仍随本批次结束 """
+        self.seq = seq
+        for event in trig_events:
+            self.events[event.device_id] = event
+            if getattr(event, "trace", None) is not None:
+                self.traces.append(event.trace)
+
+    def finish(self, status):
+        for trace in self.traces:
+            trace.finish(status)
+
+    def payload(self):
+        return {"action": "trigger", "devices": [event.data for event in self.events.values()]}
+
+
+class TriggerDispatcher:
+    """
+    触发事件的优先级调度.
+    事件按设备归入 safety > voice > sensor > info 四个优先级，每个优先级有独立的有界队列，
+    队列满时丢弃最旧的请求；同一设备的新事件会并入仍在排队的请求，替换旧的快照。
+    空闲时总是先执行最高优先级的请求；safety 另有预留的执行槽位，
+    因此无论后台堆积了多少请求，安全事件只需等待其他安全事件。
+    高优先级请求到达时，低优先级中排队超过 stale_after 秒的请求被丢弃，
+    在途的 info 请求被取消，其结果不再生效。
+    动作的生效顺序按设备以触发顺序为准：某设备已应用了更晚批次的动作时，较早批次中针对它的动作会被丢弃。
+    配置了规则引擎时，命中规则的事件在入队前直接执行对应动作，不再请求 LLM。
+    流式模式下动作在解析完成后立即执行，同时到达的动作合并为一个批次，不等待完整结果。
+    """
+    def __init__(self, oprate, apply, workers=4, max_inflight=4, safety_reserved=1, queue_size=8, stale_after=30, priority_map=None, rules=None, stream=False):
+        """
+        :param oprate: 接收 trigger JSON 字符串，返回动作 JSON 字符串的函数
+        :param apply: 接收动作 JSON 字符串并执行的函数，如 DeviceManager.cmd
+        :param workers: 工作线程数，至少为 max_inflight + safety_reserved
+        :param max_inflight: 同时在途的请求上限
+        :param safety_reserved: 仅供 safety 请求使用的额外槽位
+        :param queue_size: 每个优先级队列的长度上限
+        :param stale_after: 低优先级请求排队超过该时间（秒）即视为过期
+        :param priority_map: 设备名称或类型到优先级的映射，覆盖默认值
+        :param rules: RuleEngine 实例，为 None 时所有事件都交给 LLM
+        :param stream: 是否以流式方式调用 oprate(data, on_actions=...)
+        """
+        self._oprate = oprate
+        self._apply = apply
+        self._rules = rules
+        self._stream = stream
+        self._max_inflight = max_inflight
+        self._safety_reserved = safety_reserved
+        self._stale_after = stale_after
+        self._priority_map = dict(DEFAULT_PRIORITY)
+        self._priority_map.update(priority_map or {})
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, max_inflight + safety_reserved), thread_name_prefix="dispatch")
+        self._cond = threading.Condition()
+        self._queues = {priority: deque(maxlen=queue_size) for priority in PRIORITY_CLASSES}
+        self._running = set()
+        self._apply_lock = threading.Lock()
+        self._seq = 0
+        self._applied_seq = {}
+        self._thread = threading.Thread(target=self.__run__, daemon=True)
+        self._thread.start()
+
+    def classify(self, data):
+        """ 根据设备名称或类型确定优先级，未知设备视为 sensor """
+        priority = self._priority_map.get(data.get("name"))
+        if priority is None:
+            priority = self._priority_map.get(data.get("type"), "sensor")
+        return priority if priority in PRIORITY_CLASSES else "sensor"
+
+    def dispatch(self, trig_events):
+        """ 先用规则处理一批触发事件，其余按优先级放入队列，不阻塞调用方 """
+        if self._rules is not None and len(self._rules):
+            with tracing.span("rules"):
+                data, remaining = self._rules.evaluate(trig_events)
+            matched = [event for event in trig_events if event not in remaining]
+            if data is not None:
+                with self._cond:
+                    self._seq += 1
+                    seq = self._seq
+                print(data)
+                with tracing.activate(getattr(event, "trace", None) for event in matched):
+                    self._apply_in_order(seq, data)
+            for event in matched:
+                if getattr(event, "trace", None) is not None:
+                    event.trace.finish("rule")
+            trig_events = remaining
+        groups = {}
+        for event in trig_events:
+            groups.setdefault(self.classify(event.data), []).append(event)
+        with self._cond:
+            for priority in PRIORITY_CLASSES:
+                if priority not in groups:
+                    continue
+                self._seq += 1
+                queue = self._queues[priority]
+                device_ids = {event.device_id for event in groups[priority]}
+                if queue and device_ids & queue[-1].events.keys():
+                    queue[-1].merge(self._seq, groups[priority])
+                else:
+                    if len(queue) == queue.maxlen:
+                        logging.info(f"{priority} 队列已满，丢弃最旧的请求: {list(queue[0].events)}")
+                        queue[0].finish("dropped")
+                    queue.append(_Batch(self._seq, priority, groups[priority]))
+                self._preempt_locked(priority)
+            self._cond.notify()
+
+    def _preempt_locked(self, priority):
+        level = PRIORITY_CLASSES.index(priority)
+        now = time.time()
+        for lower in PRIORITY_CLASSES[level + 1:]:
+            queue = self._queues[lower]
+            while queue and now - queue[0].time > self._stale_after:
+                dropped = queue.popleft()
+                logging.info(f"丢弃过期的 {lower} 请求: {list(dropped.events)}")
+                dropped.finish("stale")
+        if priority != "info":
+            for batch in self._running:
+                if batch.priority == "info":
+                    batch.cancelled = True
+
+    def _next_batch_locked(self):
+        for priority in PRIORITY_CLASSES:
+            if not self._queues[priority]:
+                continue
+            limit = self._max_inflight
+            if priority == "safety":
+                limit += self._safety_reserved
+            if len(self._running) < limit:
+                return self._queues[priority].popleft()
+        return None
+
+    def __run__(self):
+        while True:
+            with self._cond:
+                batch = self._next_batch_locked()
+                while batch is None:
+                    self._cond.wait()
+                    batch = self._next_batch_locked()
+                self._running.add(batch)
+            self._executor.submit(self._process, batch)
+
+    def _process(self, batch):
+        with tracing.activate(batch.traces):
+            tracing.record("dispatch.queue", batch.time, priority=batch.priority)
+            status = self._process_traced(batch)
+        batch.finish(status)
+
+    def _process_traced(self, batch):
+        """ :return: 处理结果，记录为 Trace 的状态 """
+        status = "ok"
+        try:
+            payload = batch.payload()
+            trig_data = json.dumps(payload)
+            print(json.dumps(payload, indent=4))
+            logging.info(trig_data)
+            if self._stream:
+                streamed = []
+
+                def on_actions(actions):
+                    # 同一 chunk 中解析出的动作作为一个批次执行
+                    if batch.cancelled:
+                        return
+                    streamed.extend(actions)
+                    self._apply_in_order(batch.seq, json.dumps({"actions": actions}))
+
+                with tracing.span("oprate", stream=True):
+                    data = self._oprate(trig_data, on_actions=on_actions)
+            else:
+                streamed = None
+                with tracing.span("oprate"):
+                    data = self._oprate(trig_data)
+            print(data)
+            logging.info(data)
+            if streamed:
+                return status
+            if batch.cancelled:
+                logging.info(f"{batch.priority} 请求已被取消，忽略结果")
+                return "cancelled"
+            self._apply_in_order(batch.seq, data)
+        except Exception as e:
+            logging.error(f"处理触发事件失败: {e}")
+            status = "error"
+        finally:
+            with self._cond:
+                self._running.discard(batch)
+                self._cond.notify()
+        return status
+
+    def _apply_in_order(self, seq, data):
+        try:
+            data_decode = json.loads(data)
+        except (json.JSONDecodeError, TypeError):
+            self._apply(data)
+            return
+        if not isinstance(data_decode, dict) or not isinstance(data_decode.get("actions"), list):
+            self._apply(data)
+            return
+        with self._apply_lock:
+            actions = []
+            for item in data_decode["actions"]:
+                device_id = item.get("id") if isinstance(item, dict) else None
+                if self._applied_seq.get(device_id, 0) > seq:
+                    continue
+                self._applied_seq[device_id] = seq
+                actions.append(item)
+            if actions:
+                self._apply(json.dumps({"actions": actions}))
+
+    def queue_depths(self):
+        with self._cond:
+            return {priority: len(queue) for priority, queue in self._queues.items()}
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+__all__ = ["PRIORITY_CLASSES", "TriggerDispatcher"]
@@ -0,0 +1,57 @@
+import copy
+import queue
+import time
+
+
+class TriggerEvent:
+    """ 设备触发事件，保存触发瞬间设备数据的快照 """
+    def __init__(self, device_id, data):
+        self.device_id = device_id
+        self.data = copy.deepcopy(data)
+        self.time = time.time()
+
+
+class TriggerQueue:
+    """
+    线程安全的触发事件队列.
+    设备线程调用 put 推送事件，主循环阻塞在 wait 上，事件到达后立即被唤醒。
+    """
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def put(self, device_id, data):
+        event = TriggerEvent(device_id, data)
+        self._queue.put(event)
+        return event
+
+    def put_event(self, event):
+        """ 重新投递已有的事件，保留原始的数据快照与时间 """
+        self._queue.put(event)
+
+    def wait(self, timeout=None, window=0):
+        """
+        等待事件到达，并取出随后 window 秒内到达的全部事件.
+        :param timeout: 等待第一个事件的时间，单位秒，为 None 时一直等待
+        :param window: 合并窗口，单位秒
+        :return: 事件列表，超时返回空列表
+        """
+        try:
+            events = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        deadline = time.time() + window
+        while True:
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0:
+                    events.append(self._queue.get(timeout=remaining))
+                else:
+                    events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+__all__ = ["TriggerEvent", "TriggerQueue"]
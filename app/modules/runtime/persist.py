@@ -0,0 +1,142 @@
+import os
+import json
+import atexit
+import threading
+
+from . import tracing
+
+
+class WriteBehind:
+    """
+    设备参数的延迟写入.
+    更新先追加到日志文件并落盘，再放入内存中的待写队列，同一 id 的多次更新只保留最新值；
+    后台线程按时间间隔或待写数量达到阈值时，在一个事务中把待写内容写入数据库，随后重写日志。
+    启动时先回放日志，进程异常退出前已确认的更新不会丢失。
+    """
+    def __init__(self, store, table="param", interval=1.0, max_pending=64, journal=None, fsync=True):
+        """
+        :param store: ParamStore 实例
+        :param table: 写入的表名
+        :param interval: 最长的写入间隔，单位秒
+        :param max_pending: 待写数量达到该值时立即写入
+        :param journal: 日志文件路径，为 None 时不记录日志
+        :param fsync: 追加日志后是否调用 fsync
+        """
+        self._store = store
+        self._table = table
+        self._interval = interval
+        self._max_pending = max_pending
+        self._journal = journal
+        self._fsync = fsync
+        self._pending = {}
+        self._traces = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self.recover()
+        self._thread = threading.Thread(target=self.__run__, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _sync(self, file):
+        file.flush()
+        if self._fsync:
+            os.fsync(file.fileno())
+
+    def recover(self):
+        """ 把日志中尚未写入数据库的更新写入数据库 """
+        if self._journal is None or not os.path.exists(self._journal):
+            return
+        items = {}
+        with open(self._journal, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 写到一半的最后一行
+                    continue
+                items[entry["id"]] = entry["value"]
+        if items:
+            print(f"从日志恢复 {len(items)} 条参数")
+            if self._store.update_many(self._table, items) == "Failure":
+                return
+        open(self._journal, "w").close()
+
+    def put_many(self, items):
+        """
+        :param items: {id: value} 字典，value 为完整的参数，写入后不应再修改
+        """
+        if not items:
+            return
+        with self._cond:
+            if self._closed:
+                self._store.update_many(self._table, items)
+                return
+            if self._journal is not None:
+                with open(self._journal, "a", encoding="utf-8") as f:
+                    for id, value in items.items():
+                        f.write(json.dumps({"id": id, "value": value}) + "\n")
+                    self._sync(f)
+            self._pending.update(items)
+            # 写入数据库时记录到发起这些更新的 Trace 中
+            self._traces.extend(tracing.current())
+            if len(self._pending) >= self._max_pending:
+                self._cond.notify()
+
+    def put(self, id, value):
+        self.put_many({id: value})
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def flush(self):
+        """ 把待写内容在一个事务中写入数据库，失败时保留到下一次 """
+        with self._flush_lock:
+            with self._cond:
+                items = self._pending
+                self._pending = {}
+                traces, self._traces = self._traces, []
+            if not items:
+                return
+            with tracing.activate(traces), tracing.span("persist.flush", rows=len(items)):
+                result = self._store.update_many(self._table, items)
+            if result == "Failure":
+                with self._cond:
+                    for id, value in items.items():
+                        self._pending.setdefault(id, value)
+                return
+            with self._cond:
+                self._rewrite_journal_locked()
+
+    def _rewrite_journal_locked(self):
+        if self._journal is None:
+            return
+        tmp = self._journal + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for id, value in self._pending.items():
+                f.write(json.dumps({"id": id, "value": value}) + "\n")
+            self._sync(f)
+        os.replace(tmp, self._journal)
+
+    def __run__(self):
+        while True:
+            with self._cond:
+                if len(self._pending) < self._max_pending and not self._closed:
+                    self._cond.wait(self._interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def close(self):
+        """ 停止后台线程并写入剩余内容 """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=self._interval + 5)
+        self.flush()
+
+
+__all__ = ["WriteBehind"]
@@ -0,0 +1,126 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+
+CONSTRUCTING = "constructing"
+INITIALIZING = "initializing"
+READY = "ready"
+FAILED = "failed"
+
+
+class _Entry:
+    def __init__(self, name):
+        self.name = name
+        self.state = CONSTRUCTING
+        self.started = time.time()
+        self.ready_at = None
+        self.error = None
+
+
+class ReadinessTracker:
+    """
+    设备就绪状态跟踪.
+    设备构造完成后进入初始化阶段，通过以下任一方式通知就绪：
+    设备的 ready 属性为 threading.Event 或 Future 时等待其完成，init_time 非零时等待相应秒数，否则立即就绪。
+    未就绪设备的触发事件被暂存，就绪后交给 on_ready 回调重新投递。
+    """
+    def __init__(self, buffer_size=16, on_ready=None):
+        """
+        :param buffer_size: 每个设备最多暂存的触发事件数，超出时丢弃最旧的事件
+        :param on_ready: 设备就绪时调用，参数为设备 id 与暂存的事件列表
+        """
+        self._buffer_size = buffer_size
+        self._on_ready = on_ready
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._buffers = {}
+
+    def add(self, device_id, name):
+        with self._lock:
+            self._entries[device_id] = _Entry(name)
+            self._buffers[device_id] = deque(maxlen=self._buffer_size)
+
+    def constructed(self, device):
+        """ 设备构造完成，开始等待其就绪信号，不阻塞调用方 """
+        device_id = device.data["id"]
+        with self._lock:
+            self._entries[device_id].state = INITIALIZING
+        signal = getattr(device, "ready", None)
+        if isinstance(signal, Future):
+            signal.add_done_callback(lambda future: self._settle(device_id, future))
+        elif isinstance(signal, threading.Event):
+            threading.Thread(target=lambda: (signal.wait(), self.mark_ready(device_id)), daemon=True).start()
+        elif getattr(device, "init_time", 0):
+            timer = threading.Timer(device.init_time, self.mark_ready, (device_id,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self.mark_ready(device_id)
+
+    def _settle(self, device_id, future):
+        if future.cancelled() or future.exception() is not None:
+            self.mark_failed(device_id, future.exception() if not future.cancelled() else "cancelled")
+        else:
+            self.mark_ready(device_id)
+
+    def mark_ready(self, device_id):
+        with self._lock:
+            entry = self._entries[device_id]
+            if entry.state == READY:
+                return
+            entry.state = READY
+            entry.ready_at = time.time()
+            events = list(self._buffers[device_id])
+            self._buffers[device_id].clear()
+        print(f"设备 {entry.name} 就绪，用时 {entry.ready_at - entry.started:.2f}s")
+        if self._on_ready is not None:
+            self._on_ready(device_id, events)
+
+    def mark_failed(self, device_id, error):
+        with self._lock:
+            entry = self._entries[device_id]
+            entry.state = FAILED
+            entry.error = str(error)
+            self._buffers[device_id].clear()
+
+    def is_ready(self, device_id):
+        entry = self._entries.get(device_id)
+        return entry is not None and entry.state == READY
+
+    def buffer(self, event):
+        """
+        暂存未就绪设备的触发事件.
+        :return: 是否已暂存，设备已就绪或已失败时返回 False
+        """
+        with self._lock:
+            entry = self._entries.get(event.device_id)
+            if entry is None or entry.state in (READY, FAILED):
+                return False
+            self._buffers[event.device_id].append(event)
+            return True
+
+    def health(self):
+        """ 每个设备的就绪状态与初始化耗时 """
+        now = time.time()
+        with self._lock:
+            devices = [
+                {
+                    "id": device_id,
+                    "name": entry.name,
+                    "state": entry.state,
+                    "init_seconds": round((entry.ready_at or now) - entry.started, 3),
+                    "buffered": len(self._buffers[device_id]),
+                    "error": entry.error,
+                }
+                for device_id, entry in sorted(self._entries.items())
+            ]
+        return {
+            "ready": sum(1 for device in devices if device["state"] == READY),
+            "total": len(devices),
+            "devices": devices,
+        }
+
+
+__all__ = ["ReadinessTracker"]
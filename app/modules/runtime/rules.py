@@ -0,0 +1,152 @@
+import re
+import json
+
+
+def _normalize_text(value):
+    return " ".join(str(value).split()).lower()
+
+
+def _compile_condition(expected):
+    """
+    将单个字段的匹配条件编译为判断函数.
+    字符串：去除首尾空白、忽略大小写后完全相等，以 "re:" 开头时作为正则表达式搜索；
+    字典：支持 eq、contains、gt、ge、lt、le，多个条件同时满足；
+    其他值：直接比较是否相等。
+    """
+    if isinstance(expected, str):
+        if expected.startswith("re:"):
+            pattern = re.compile(expected[3:], re.IGNORECASE)
+            return lambda value: isinstance(value, str) and pattern.search(value) is not None
+        text = _normalize_text(expected)
+        return lambda value: isinstance(value, str) and _normalize_text(value) == text
+    if isinstance(expected, dict):
+        checks = []
+        for op, operand in expected.items():
+            if op == "eq":
+                checks.append(_compile_condition(operand))
+            elif op == "contains":
+                text = _normalize_text(operand)
+                checks.append(lambda value, text=text: isinstance(value, str) and text in _normalize_text(value))
+            elif op in ("gt", "ge", "lt", "le"):
+                compare = {
+                    "gt": lambda a, b: a > b,
+                    "ge": lambda a, b: a >= b,
+                    "lt": lambda a, b: a < b,
+                    "le": lambda a, b: a <= b,
+                }[op]
+                checks.append(lambda value, compare=compare, operand=operand: isinstance(value, (int, float)) and not isinstance(value, bool) and compare(value, operand))
+            else:
+                raise ValueError(f"Unknown operator: {op}")
+        return lambda value: all(check(value) for check in checks)
+    return lambda value: value == expected
+
+
+def _lookup(present, path):
+    value = present
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+class Rule:
+    def __init__(self, index, spec):
+        """
+        :param index: 规则在配置中的顺序，数值小的优先
+        :param spec: 规则配置，包含 device/type/id、match 与 actions
+        """
+        self.index = index
+        self.name = spec.get("name", f"rule{index}")
+        self.device = spec.get("device")
+        self.device_id = spec.get("id")
+        self.type = spec.get("type")
+        if self.device is None and self.device_id is None and self.type is None:
+            raise ValueError(f"Rule {self.name} needs one of device, id or type")
+        self._conditions = [
+            (key.split("."), _compile_condition(expected))
+            for key, expected in spec.get("match", {}).items()
+        ]
+        self._actions = spec.get("actions", [])
+        self.actions = []
+
+    def bind(self, ids_by_name):
+        """ 将动作中的设备名称解析为设备 id，有设备缺失时返回 False，该规则不启用 """
+        self.actions = []
+        for action in self._actions:
+            device_id = action.get("id")
+            if device_id is None:
+                device_id = ids_by_name.get(action.get("device"))
+            if device_id is None:
+                print(f"规则 {self.name} 中的设备 {action.get('device')} 不存在，规则未启用")
+                return False
+            self.actions.append({"id": device_id, "param": dict(action.get("param", {}))})
+        return True
+
+    def match(self, present):
+        return all(condition(_lookup(present, path)) for path, condition in self._conditions)
+
+
+class RuleEngine:
+    """
+    本地确定性规则引擎.
+    规则在加载时编译并按设备 id 与设备类型建立索引，命中时直接生成与 LLM 相同格式的动作，
+    只有未命中任何规则的触发才交给 LLM 处理。
+    """
+    def __init__(self, specs=None):
+        self._rules = [Rule(index, spec) for index, spec in enumerate(specs or [])]
+        self._by_id = {}
+        self._by_type = {}
+
+    def __len__(self):
+        return len(self._rules)
+
+    def bind(self, devices):
+        """
+        根据已注册的设备建立索引.
+        :param devices: 设备数据列表，即 all_device_config["devices"]
+        """
+        ids_by_name = {device["name"]: device["id"] for device in devices}
+        self._by_id = {}
+        self._by_type = {}
+        for rule in self._rules:
+            if not rule.bind(ids_by_name):
+                continue
+            if rule.device_id is not None:
+                self._by_id.setdefault(rule.device_id, []).append(rule)
+            elif rule.device is not None:
+                if rule.device in ids_by_name:
+                    self._by_id.setdefault(ids_by_name[rule.device], []).append(rule)
+            else:
+                self._by_type.setdefault(rule.type, []).append(rule)
+
+    def match(self, device_data):
+        """ 返回第一条命中规则的动作列表，未命中返回 None """
+        candidates = self._by_id.get(device_data.get("id"), []) + self._by_type.get(device_data.get("type"), [])
+        if not candidates:
+            return None
+        present = device_data.get("param", {}).get("present", {})
+        for rule in sorted(candidates, key=lambda rule: rule.index):
+            if rule.match(present):
+                return rule.actions
+        return None
+
+    def evaluate(self, trig_events):
+        """
+        对一批触发事件应用规则.
+        :return: (动作 JSON 字符串或 None, 未命中规则的事件列表)
+        """
+        actions = []
+        unmatched = []
+        for event in trig_events:
+            rule_actions = self.match(event.data)
+            if rule_actions is None:
+                unmatched.append(event)
+            else:
+                actions.extend(rule_actions)
+        if not actions:
+            return None, unmatched
+        return json.dumps({"actions": actions}), unmatched
+
+
+__all__ = ["Rule", "RuleEngine"]
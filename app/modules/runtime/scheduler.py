@@ -0,0 +1,159 @@
+import time
+import heapq
+import queue
+import itertools
+import threading
+import traceback
+
+
+class Job:
+    """ 调度器中的一个任务，interval 为 None 时只执行一次 """
+    def __init__(self, name, func, args, due, interval):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.due = due
+        self.interval = interval
+        self.cancelled = False
+        self.running = False
+        self.runs = 0
+        self.skipped = 0
+        self.errors = 0
+        self.last_error = None
+        self.total_runtime = 0.0
+        self.max_runtime = 0.0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+
+    def cancel(self):
+        self.cancelled = True
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "interval": self.interval,
+            "next_run_in": round(self.due - time.time(), 3) if not self.cancelled else None,
+            "running": self.running,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "avg_runtime": self.total_runtime / self.runs if self.runs else 0.0,
+            "max_runtime": self.max_runtime,
+            "avg_lateness": self.total_lateness / self.runs if self.runs else 0.0,
+            "max_lateness": self.max_lateness,
+        }
+
+
+class Scheduler:
+    """
+    所有设备共用的定时任务调度器.
+    一个计时线程按到期时间维护任务堆，到期的任务交给少量工作线程执行，任务中可以进行阻塞 I/O。
+    周期任务按固定频率执行，上一次还未执行完时跳过本次；错过的周期不补执行。
+    每个任务记录执行次数、耗时与延迟（实际开始时间与到期时间之差）。
+    """
+    def __init__(self, workers=4):
+        """
+        :param workers: 工作线程数
+        """
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._jobs = []
+        self._ready = queue.Queue()
+        self._workers = workers
+        self._timer = threading.Thread(target=self.__run__, name="scheduler", daemon=True)
+        self._timer.start()
+        for i in range(workers):
+            threading.Thread(target=self.__work__, name=f"scheduler-worker-{i}", daemon=True).start()
+
+    def _add(self, job):
+        with self._cond:
+            self._jobs.append(job)
+            heapq.heappush(self._heap, (job.due, next(self._seq), job))
+            self._cond.notify()
+        return job
+
+    def call_later(self, delay, func, *args, name=None):
+        """ delay 秒后执行一次 func(*args) """
+        return self._add(Job(name or getattr(func, "__qualname__", repr(func)), func, args, time.time() + delay, None))
+
+    def call_every(self, interval, func, *args, name=None, delay=None):
+        """
+        每隔 interval 秒执行一次 func(*args).
+        :param delay: 首次执行前的等待时间，默认为 interval
+        """
+        due = time.time() + (interval if delay is None else delay)
+        return self._add(Job(name or getattr(func, "__qualname__", repr(func)), func, args, due, interval))
+
+    def submit(self, func, *args, name=None):
+        """ 立即在工作线程中执行一次 func(*args) """
+        return self.call_later(0, func, *args, name=name)
+
+    def __run__(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.time():
+                    self._cond.wait(self._heap[0][0] - time.time() if self._heap else None)
+                due, _, job = heapq.heappop(self._heap)
+                if job.cancelled:
+                    self._jobs.remove(job)
+                    continue
+                if job.interval is not None:
+                    job.due = due + job.interval
+                    if job.due <= time.time():
+                        job.due = time.time() + job.interval
+                    heapq.heappush(self._heap, (job.due, next(self._seq), job))
+                else:
+                    self._jobs.remove(job)
+                if job.running:
+                    job.skipped += 1
+                    continue
+                job.running = True
+            self._ready.put((due, job))
+
+    def __work__(self):
+        while True:
+            due, job = self._ready.get()
+            start = time.time()
+            lateness = max(0.0, start - due)
+            try:
+                job.func(*job.args)
+            except Exception as e:
+                job.errors += 1
+                job.last_error = repr(e)
+                print(f"定时任务 {job.name} 执行失败: {e}")
+                traceback.print_exc()
+            runtime = time.time() - start
+            job.runs += 1
+            job.total_runtime += runtime
+            job.max_runtime = max(job.max_runtime, runtime)
+            job.total_lateness += lateness
+            job.max_lateness = max(job.max_lateness, lateness)
+            job.running = False
+
+    def stats(self):
+        """ 每个任务的执行情况 """
+        with self._cond:
+            jobs = list(self._jobs)
+        return {
+            "workers": self._workers,
+            "queued": self._ready.qsize(),
+            "jobs": [job.stats() for job in jobs],
+        }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(workers=4):
+    """ 返回全局共用的调度器，首次调用时创建，workers 只在创建时生效 """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler(workers=workers)
+        return _scheduler
+
+
+__all__ = ["Job", "Scheduler", "get_scheduler"]
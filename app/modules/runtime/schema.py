@@ -0,0 +1,152 @@
+import math
+
+
+class ValidationError(Exception):
+    """ 参数不符合设备的 selection 声明 """
+
+
+def _coerce_type(expected):
+    """ 没有 selection 声明的字段沿用原有的类型转换 """
+    if expected is bool:
+        def validate(value):
+            if isinstance(value, str):
+                lowered = value.strip().lower()
+                if lowered in ("true", "on", "1", "yes"):
+                    return True
+                if lowered in ("false", "off", "0", "no", ""):
+                    return False
+                raise ValidationError(f"expected bool, got {value!r}")
+            return bool(value)
+        return validate
+
+    def validate(value):
+        try:
+            return expected(value)
+        except (ValueError, TypeError):
+            raise ValidationError(f"expected {expected.__name__}, got {value!r}")
+    return validate
+
+
+def _select(options):
+    lookup = {str(option).strip().lower(): option for option in options}
+
+    def validate(value):
+        option = lookup.get(str(value).strip().lower())
+        if option is None:
+            raise ValidationError(f"expected one of {list(options)}, got {value!r}")
+        return option
+    return validate
+
+
+def _range(low, high, clamp):
+    integral = isinstance(low, int) and isinstance(high, int)
+
+    def validate(value):
+        if isinstance(value, bool):
+            raise ValidationError(f"expected number in [{low}, {high}], got {value!r}")
+        try:
+            number = float(value)
+        except (ValueError, TypeError):
+            raise ValidationError(f"expected number in [{low}, {high}], got {value!r}")
+        if math.isnan(number):
+            raise ValidationError(f"expected number in [{low}, {high}], got {value!r}")
+        if number < low or number > high:
+            if not clamp:
+                raise ValidationError(f"{value!r} out of range [{low}, {high}]")
+            number = min(max(number, low), high)
+        return int(round(number)) if integral else number
+    return validate
+
+
+def _sequence(validators):
+    def validate(value):
+        if not isinstance(value, (list, tuple)) or len(value) != len(validators):
+            raise ValidationError(f"expected list of {len(validators)} items, got {value!r}")
+        result = []
+        for index, (item_validator, item) in enumerate(zip(validators, value)):
+            try:
+                result.append(item_validator(item))
+            except ValidationError as e:
+                raise ValidationError(f"[{index}]: {e}")
+        return result
+    return validate
+
+
+def compile_spec(spec, clamp=True):
+    """
+    把 selection 中单个字段的声明编译为校验函数.
+    ["__SELECT__", ...] 为枚举，["__RANGE__", low, high] 为数值范围（clamp 为真时截断到范围内），
+    由声明组成的列表为定长列表，逐项校验；其他值按其类型转换。
+    :return: 接收原始值、返回转换后的值的函数，不合法时抛出 ValidationError
+    """
+    if isinstance(spec, list) and spec:
+        if spec[0] == "__SELECT__":
+            return _select(spec[1:])
+        if spec[0] == "__RANGE__":
+            return _range(spec[1], spec[2], clamp)
+        return _sequence([compile_spec(item, clamp) for item in spec])
+    return _coerce_type(type(spec))
+
+
+class DeviceSchema:
+    """ 设备参数的校验器，注册设备时根据 present 与 selection 一次性生成 """
+    def __init__(self, param, clamp=True):
+        """
+        :param param: 设备 data 中的 param 字典
+        :param clamp: 超出范围的数值是否截断，为假时视为错误
+        """
+        selection = param.get("selection", {})
+        self._validators = {}
+        for key, value in param.get("present", {}).items():
+            if key in selection:
+                self._validators[key] = compile_spec(selection[key], clamp)
+            else:
+                self._validators[key] = _coerce_type(type(value))
+
+    def validate(self, param):
+        """
+        :param param: 动作中的 param 字典
+        :return: (转换后的值字典, 错误列表)，每个错误为 {"field": 字段, "error": 原因}
+        """
+        values = {}
+        errors = []
+        for key, value in param.items():
+            validator = self._validators.get(key)
+            if validator is None:
+                errors.append({"field": key, "error": "unknown field"})
+                continue
+            try:
+                values[key] = validator(value)
+            except ValidationError as e:
+                errors.append({"field": key, "error": str(e)})
+        return values, errors
+
+
+def validate_actions(actions, schemas):
+    """
+    一次遍历校验整批动作，同一设备的多个动作按顺序合并.
+    :param actions: 动作列表
+    :param schemas: 设备 id 到 DeviceSchema 的映射
+    :return: ([(设备 id, 值字典)], 错误列表)，错误带有动作序号 index 与设备 id
+    """
+    updates = {}
+    errors = []
+    for index, item in enumerate(actions):
+        device_id = item.get("id") if isinstance(item, dict) else None
+        device_schema = schemas.get(device_id) if isinstance(device_id, (int, str)) else None
+        if device_schema is None:
+            errors.append({"index": index, "id": device_id, "field": None, "error": "unknown device"})
+            continue
+        param = item.get("param")
+        if not isinstance(param, dict):
+            errors.append({"index": index, "id": device_id, "field": None, "error": "param must be an object"})
+            continue
+        values, field_errors = device_schema.validate(param)
+        for error in field_errors:
+            errors.append(dict(error, index=index, id=device_id))
+        if values:
+            updates.setdefault(device_id, {}).update(values)
+    return list(updates.items()), errors
+
+
+__all__ = ["DeviceSchema", "ValidationError", "compile_spec", "validate_actions"]
@@ -0,0 +1,83 @@
+import gzip
+import time
+import hashlib
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class Snapshot:
+    """ 某一版本状态的序列化结果，压缩后的内容按需生成并缓存 """
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def encode(self, encoding):
+        """
+        :param encoding: "gzip"、"br" 或 None
+        :return: (内容, 对应的 ETag)
+        """
+        if encoding is None:
+            return self.body, self.etag
+        with self._lock:
+            if encoding not in self._encoded:
+                if encoding == "br":
+                    self._encoded[encoding] = brotli.compress(self.body)
+                else:
+                    self._encoded[encoding] = gzip.compress(self.body, compresslevel=6, mtime=0)
+            return self._encoded[encoding], f"{self.etag}-{encoding}"
+
+
+class SnapshotCache:
+    """
+    预先序列化的状态快照.
+    只有状态版本变化，或距上次生成超过 refresh 秒（设备线程会直接修改数据）时才重新序列化；
+    重新序列化的结果与上次相同时沿用原快照，ETag 保持不变。
+    """
+    def __init__(self, build, version=None, refresh=1.0):
+        """
+        :param build: 返回序列化后 bytes 的函数
+        :param version: 返回当前状态版本号的函数
+        :param refresh: 最长的重新序列化间隔，单位秒
+        """
+        self._build = build
+        self._version = version or (lambda: 0)
+        self._refresh = refresh
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._built_version = None
+        self._built_at = 0
+        self._seq = 0
+
+    def get(self):
+        version = self._version()
+        with self._lock:
+            if self._snapshot is not None and version == self._built_version and time.time() - self._built_at < self._refresh:
+                return self._snapshot
+            body = self._build()
+            self._built_version = version
+            self._built_at = time.time()
+            if self._snapshot is None or body != self._snapshot.body:
+                self._seq += 1
+                self._snapshot = Snapshot(self._seq, body)
+            return self._snapshot
+
+
+def accepted_encoding(accept_encodings, min_size, body):
+    """ 根据 Accept-Encoding 选择压缩方式，内容过小时不压缩 """
+    if len(body) < min_size:
+        return None
+    if brotli is not None and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+__all__ = ["Snapshot", "SnapshotCache", "accepted_encoding"]
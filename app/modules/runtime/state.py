@@ -0,0 +1,149 @@
+import copy
+import threading
+from collections import deque
+
+
+def _escape(key):
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def json_patch(old, new, path=""):
+    """ 生成把 old 变为 new 的 JSON Patch 操作列表，列表整体替换 """
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": f"{path}/{_escape(key)}", "value": value})
+            elif old[key] != value:
+                ops.extend(json_patch(old[key], value, f"{path}/{_escape(key)}"))
+        return ops
+    if old == new and type(old) is type(new):
+        return []
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+class StateStore:
+    """
+    带版本号的设备状态存储.
+    每次提交都会生成 present 的新副本（写时复制），旧副本不会再被修改，
+    读取方拿到的快照因此始终一致。全局版本号单调递增，每个设备另记录最后修改时的版本号，
+    最近的变化以 JSON Patch 的形式保存，供客户端按版本号增量获取。
+    """
+    def __init__(self, history=1024):
+        """
+        :param history: 保留的变化记录条数
+        """
+        self._lock = threading.Lock()
+        self._log = deque(maxlen=history)
+        self._version = 0
+        self._init_param = {}
+        self._devices = {}
+        self._index = {}
+        self._device_versions = {}
+        self._document = None
+        self._structure_version = 0
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def structure_version(self):
+        """ 设备组成或 init_param 变化时递增，present 的变化不影响 """
+        return self._structure_version
+
+    def device_version(self, device_id):
+        return self._device_versions.get(device_id, 0)
+
+    def _record_locked(self, ops):
+        self._version += 1
+        self._log.append((self._version, ops))
+        self._document = None
+        return self._version
+
+    def set_init_param(self, init_param):
+        with self._lock:
+            new = copy.deepcopy(init_param)
+            ops = json_patch(self._init_param, new, "/init_param")
+            if ops:
+                self._init_param = new
+                self._structure_version += 1
+                self._record_locked(ops)
+            return ops
+
+    def register(self, data):
+        """ 注册设备，data 为设备的 data 字典，除 present 外的字段视为不变 """
+        with self._lock:
+            device_id = data["id"]
+            device = {key: value for key, value in data.items() if key != "param"}
+            device["param"] = {key: copy.deepcopy(value) for key, value in data["param"].items()}
+            index = len(self._index) if device_id not in self._index else self._index[device_id]
+            self._index[device_id] = index
+            self._devices[device_id] = device
+            self._structure_version += 1
+            ops = [{"op": "add", "path": f"/devices/{index}", "value": device}]
+            self._device_versions[device_id] = self._record_locked(ops)
+            return ops
+
+    def commit(self, device_id, present):
+        """
+        提交设备的最新 present，与上一版本相同时不产生新版本.
+        :return: 本次变化的 JSON Patch 操作列表
+        """
+        with self._lock:
+            device = self._devices.get(device_id)
+            if device is None:
+                return []
+            old = device["param"].get("present", {})
+            if old == present:
+                return []
+            new = copy.deepcopy(present)
+            ops = json_patch(old, new, f"/devices/{self._index[device_id]}/param/present")
+            device = dict(device)
+            device["param"] = dict(device["param"], present=new)
+            self._devices[device_id] = device
+            self._device_versions[device_id] = self._record_locked(ops)
+            return ops
+
+    def present(self, device_id):
+        """ 设备当前 present 的只读快照 """
+        device = self._devices.get(device_id)
+        return device["param"].get("present") if device is not None else None
+
+    def snapshot(self, status="init"):
+        """ 当前完整状态的只读快照，结构与 all_device_config 相同 """
+        with self._lock:
+            if self._document is None:
+                devices = sorted(self._devices.items(), key=lambda item: self._index[item[0]])
+                self._document = {
+                    "status": status,
+                    "init_param": self._init_param,
+                    "devices": [device for _, device in devices],
+                }
+            return self._version, self._document
+
+    def diff(self, since):
+        """
+        :param since: 客户端持有的版本号
+        :return: (当前版本号, JSON Patch 操作列表)，版本过旧或超前时返回替换整个文档的操作
+        """
+        with self._lock:
+            version = self._version
+            if since == version:
+                return version, []
+            # 版本号超过当前版本（如重启后计数重新开始）与过旧的版本同样返回完整文档
+            if since is None or since > version or not self._log or since < self._log[0][0] - 1:
+                full = True
+            else:
+                full = False
+                ops = [op for log_version, log_ops in self._log if log_version > since for op in log_ops]
+        if full:
+            version, document = self.snapshot()
+            return version, [{"op": "replace", "path": "", "value": document}]
+        return version, ops
+
+
+__all__ = ["StateStore", "json_patch"]
@@ -0,0 +1,122 @@
+import json
+import time
+import queue
+import sqlite3
+import threading
+
+from .metrics import histogram, lock_wait_seconds
+
+_db_seconds = histogram("hi_db_seconds", "SQLite 调用耗时（秒），含等待连接与写锁", ["op", "table"])
+
+
+class ParamStore:
+    """
+    设备参数的持久化存储.
+    使用一个长连接负责写入（由锁串行化），另有一组只读连接组成连接池，
+    数据库开启 WAL 模式，读写互不阻塞。SQL 语句固定，借助 sqlite3 的语句缓存复用预编译结果。
+    """
+    def __init__(self, db_file, tables=("param", "userinfo"), readers=2, timeout=5):
+        """
+        :param db_file: 数据库文件路径
+        :param tables: 允许访问的表名
+        :param readers: 只读连接数量
+        :param timeout: 等待写锁及数据库忙等的超时时间，单位秒
+        """
+        self._db_file = db_file
+        self._timeout = timeout
+        self._tables = tuple(tables)
+        self._sql = {
+            table: {
+                "select": f"SELECT param FROM {table} WHERE id=?",
+                "insert": f"INSERT OR REPLACE INTO {table} (id, param) VALUES (?, ?)",
+                "update": f"UPDATE {table} SET param=? WHERE id=?",
+            }
+            for table in self._tables
+        }
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute("PRAGMA synchronous=NORMAL")
+        self._readers = queue.LifoQueue()
+        for _ in range(readers):
+            conn = self._connect()
+            conn.execute("PRAGMA query_only=ON")
+            self._readers.put(conn)
+
+    def _connect(self):
+        conn = sqlite3.connect(self._db_file, timeout=self._timeout, check_same_thread=False, cached_statements=64)
+        return conn
+
+    def _statement(self, table, kind):
+        if table not in self._sql:
+            raise ValueError(f"Unknown table: {table}")
+        return self._sql[table][kind]
+
+    def init_tables(self, force=False):
+        with self._write_lock:
+            with self._writer:
+                for table in self._tables:
+                    if force:
+                        self._writer.execute(f"DROP TABLE IF EXISTS {table}")
+                    self._writer.execute(f"CREATE TABLE IF NOT EXISTS {table} (id TEXT PRIMARY KEY, param BLOB)")
+
+    def read(self, table, id):
+        sql = self._statement(table, "select")
+        with _db_seconds.labels("read", table).time():
+            try:
+                conn = self._readers.get(timeout=self._timeout)
+            except queue.Empty:
+                return None
+            try:
+                result = conn.execute(sql, (id,)).fetchone()
+            finally:
+                self._readers.put(conn)
+        if result:
+            return json.loads(result[0].decode("utf-8"))
+        return None
+
+    def _execute_write(self, sql, args, many=False):
+        start = time.perf_counter()
+        acquired = self._write_lock.acquire(timeout=self._timeout)
+        lock_wait_seconds.labels("db_write").observe(time.perf_counter() - start)
+        if not acquired:
+            return "Failure"
+        try:
+            with self._writer:
+                if many:
+                    self._writer.executemany(sql, args)
+                else:
+                    self._writer.execute(sql, args)
+        except sqlite3.Error as e:
+            print(f"写入数据库失败: {e}")
+            return "Failure"
+        finally:
+            self._write_lock.release()
+
+    def update_many(self, table, items):
+        """
+        在一个事务中批量更新.
+        :param items: {id: value} 字典
+        """
+        sql = self._statement(table, "update")
+        rows = [(json.dumps(value).encode("utf-8"), id) for id, value in items.items()]
+        if rows:
+            with _db_seconds.labels("update_many", table).time():
+                return self._execute_write(sql, rows, many=True)
+
+    def write(self, table, id, value):
+        with _db_seconds.labels("write", table).time():
+            return self._execute_write(self._statement(table, "insert"), (id, json.dumps(value).encode("utf-8")))
+
+    def update(self, table, id, value):
+        with _db_seconds.labels("update", table).time():
+            return self._execute_write(self._statement(table, "update"), (json.dumps(value).encode("utf-8"), id))
+
+    def close(self):
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+        with self._write_lock:
+            self._writer.close()
+
+
+__all__ = ["ParamStore"]
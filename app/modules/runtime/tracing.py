@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import OrderedDict
+
+from .scheduler import get_scheduler
+
+
+# 当前线程正在处理的 Trace，一次 LLM 请求可能同时服务于多个触发，因此为元组
+_current = contextvars.ContextVar("hi_traces", default=())
+
+
+class Trace:
+    """
+    一次触发从设备事件到硬件动作的时间线.
+    各环节在不同线程中记录 span，span 可以在 finish 之后继续追加（如延迟写库、驱动线程中的硬件调用）。
+    """
+    def __init__(self, tracer, name, start=None, **attrs):
+        self.id = os.urandom(8).hex()
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time() if start is None else start
+        self.status = "running"
+        self.spans = []
+        self._tracer = tracer
+        self._lock = threading.Lock()
+
+    def add(self, name, start, end, **attrs):
+        span = {"name": name, "start": start, "end": end, "thread": threading.current_thread().name}
+        if attrs:
+            span["attrs"] = attrs
+        with self._lock:
+            self.spans.append(span)
+
+    def finish(self, status="ok"):
+        """ 触发的处理流程结束，之后到达的 span 仍会被记录 """
+        if self.status != "running":
+            return
+        self.status = status
+        if self._tracer is not None:
+            self._tracer._finished(self)
+
+    @property
+    def end(self):
+        with self._lock:
+            return max([span["end"] for span in self.spans], default=self.start)
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start"])
+        return {
+            "id": self.id,
+            "name": self.name,
+            "attrs": self.attrs,
+            "status": self.status,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "spans": [
+                dict(
+                    span,
+                    offset_ms=round((span["start"] - self.start) * 1000, 3),
+                    duration_ms=round((span["end"] - span["start"]) * 1000, 3),
+                )
+                for span in spans
+            ],
+        }
+
+    def waterfall(self, width=48):
+        """ 以文本条形图显示各 span 在时间线上的位置 """
+        data = self.to_dict()
+        total = max(data["duration_ms"], 0.001)
+        attrs = " ".join(f"{key}={value}" for key, value in self.attrs.items())
+        lines = [f"trace {self.id} {self.name} {attrs} {self.status} {data['duration_ms']:.1f} ms"]
+        for span in data["spans"]:
+            left = min(int(span["offset_ms"] / total * width), width - 1)
+            length = max(1, min(int(span["duration_ms"] / total * width), width - left))
+            bar = " " * left + "█" * length
+            lines.append(f"  {span['name']:<24}|{bar:<{width}}| {span['offset_ms']:9.1f} +{span['duration_ms']:.1f} ms  [{span['thread']}]")
+        return "\n".join(lines)
+
+
+def current():
+    """ 当前上下文中的 Trace 元组，驱动在 on_change 中取得后随命令一起交给自己的线程 """
+    return _current.get()
+
+
+@contextmanager
+def activate(traces):
+    """ 在 with 块内把 traces 设为当前上下文，其中的 span 记录到每个 Trace """
+    token = _current.set(tuple(trace for trace in traces if trace is not None))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name, **attrs):
+    """ 记录 with 块的耗时，当前没有 Trace 时不做任何事 """
+    traces = _current.get()
+    if not traces:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        end = time.time()
+        for trace in traces:
+            trace.add(name, start, end, **attrs)
+
+
+def record(name, start, end=None, **attrs):
+    """ 记录已知起止时间的 span，end 缺省为当前时间 """
+    end = time.time() if end is None else end
+    for trace in _current.get():
+        trace.add(name, start, end, **attrs)
+
+
+class Tracer:
+    """
+    Trace 的环形缓冲区.
+    保留最近 capacity 个 Trace；启用自动导出时，结束后再等待 settle 秒让迟到的 span 到齐，
+    总耗时超过 outlier_seconds 的 Trace 以 JSON 行追加到 dump_path。
+    导出文件超过 max_bytes 时轮转为 dump_path.1，磁盘占用不超过两个文件。
+    """
+    def __init__(self, capacity=256, outlier_seconds=3.0, dump_path=None, settle=5.0, auto_dump=False, max_bytes=1024 * 1024):
+        """
+        :param capacity: 保留的 Trace 数
+        :param outlier_seconds: 视为异常慢的总耗时（秒），为 0 时不自动导出
+        :param dump_path: 异常 Trace 的导出文件，为 None 时不导出
+        :param settle: Trace 结束后等待迟到 span 的时间（秒）
+        :param auto_dump: 是否自动导出异常 Trace
+        :param max_bytes: 导出文件的轮转大小，为 0 时不轮转
+        """
+        self._capacity = capacity
+        self._outlier_seconds = outlier_seconds
+        self._dump_path = dump_path
+        self._settle = settle
+        self._auto_dump = auto_dump
+        self._max_bytes = max_bytes
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+        self._dump_lock = threading.Lock()
+        self.dumped = 0
+
+    def start(self, name, start=None, **attrs):
+        trace = Trace(self, name, start=start, **attrs)
+        with self._lock:
+            self._traces[trace.id] = trace
+            while len(self._traces) > self._capacity:
+                self._traces.popitem(last=False)
+        return trace
+
+    def _finished(self, trace):
+        if not self._auto_dump or self._dump_path is None or not self._outlier_seconds:
+            return
+        get_scheduler().call_later(self._settle, self._check, trace, name="tracer.outlier")
+
+    def _check(self, trace):
+        if trace.duration >= self._outlier_seconds:
+            self.dump([trace])
+
+    def get(self, trace_id):
+        with self._lock:
+            return self._traces.get(trace_id)
+
+    def recent(self, limit=20, min_seconds=0.0):
+        """ 最近的 Trace，按开始时间从新到旧 """
+        with self._lock:
+            traces = list(self._traces.values())
+        traces = [trace for trace in reversed(traces) if trace.duration >= min_seconds]
+        return traces[:limit]
+
+    def dump(self, traces, path=None):
+        """
+        把 Trace 以 JSON 行追加到文件.
+        :return: 写入的条数
+        """
+        path = path or self._dump_path
+        if path is None or not traces:
+            return 0
+        with self._dump_lock:
+            self._rotate(path)
+            with open(path, "a", encoding="utf-8") as f:
+                for trace in traces:
+                    f.write(json.dumps(trace.to_dict(), ensure_ascii=False) + "\n")
+            self.dumped += len(traces)
+        return len(traces)
+
+    def _rotate(self, path):
+        if not self._max_bytes:
+            return
+        try:
+            if os.path.getsize(path) >= self._max_bytes:
+                os.replace(path, path + ".1")
+        except OSError:
+            pass
+
+    def dump_outliers(self, min_seconds=None, path=None):
+        """ 导出缓冲区中总耗时不低于 min_seconds 的 Trace，缺省使用 outlier_seconds """
+        min_seconds = self._outlier_seconds if min_seconds is None else min_seconds
+        return self.dump(self.recent(self._capacity, min_seconds), path)
+
+    @property
+    def dump_path(self):
+        return self._dump_path
+
+
+__all__ = ["Trace", "Tracer"]
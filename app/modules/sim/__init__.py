@@ -0,0 +1,87 @@
+"""
+无硬件的模拟后端.
+用模拟模块替换 GPIO、串口、I2C、摄像头、音频等硬件库，拦截天气等外部服务，并提供 OpenAI 兼容的模拟 LLM，
+使完整的 DeviceManager 可以在普通 Linux 主机上运行。
+config.toml 中 [sim] enabled = true 或环境变量 HI_SIM=1 时启用；模拟时不应设置 DEBUG，否则设备会走各自的调试分支。
+"""
+import os
+import shutil
+
+import toml
+
+from .hardware import *
+from .network import *
+from .llm import *
+
+
+def _config():
+    try:
+        with open(os.getcwd() + "/source/config.toml", "r", encoding="utf-8") as f:
+            return toml.load(f).get("sim", {})
+    except (OSError, toml.TomlDecodeError):
+        return {}
+
+
+def sim_config():
+    """ config.toml 中的 [sim]，环境变量 HI_SIM 优先于 enabled """
+    config = dict(_config())
+    env = os.environ.get("HI_SIM")
+    if env is not None:
+        config["enabled"] = env.lower() in ("1", "true", "yes")
+    return config
+
+
+def enabled():
+    return bool(sim_config().get("enabled", False))
+
+
+_installed = False
+
+
+def install():
+    """ 安装模拟硬件与外部服务，需在导入设备模块之前调用 """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    config = sim_config()
+    environment.latency.update(config.get("latency", {}))
+    install_hardware()
+    install_network()
+    print("模拟模式：硬件与外部服务均为模拟")
+
+
+def llm_endpoint():
+    """
+    启用模拟 LLM 时启动服务.
+    :return: (api_base, api_key)，未启用时返回 None
+    """
+    config = sim_config()
+    if not config.get("enabled", False) or not config.get("llm", True):
+        return None
+    server = start_llm(latency=float(config.get("llm_latency", 0.3)), port=int(config.get("llm_port", 0)))
+    return server.base_url, "sim"
+
+
+def prepare(workdir, config):
+    """
+    创建运行模拟的工作目录.
+    写入 source/config.toml，并放置模型与 GeoIP 数据库的占位文件，避免驱动尝试下载。
+    :param config: 配置字典，[sim] enabled 会被设为 true
+    :return: workdir
+    """
+    source = os.path.join(workdir, "source")
+    os.makedirs(os.path.join(source, "yolo11n_ncnn_model"), exist_ok=True)
+    open(os.path.join(source, "GeoLite2-City.mmdb"), "a").close()
+    config = dict(config)
+    config["sim"] = dict(config.get("sim", {}), enabled=True)
+    with open(os.path.join(source, "config.toml"), "w", encoding="utf-8") as f:
+        toml.dump(config, f)
+    return workdir
+
+
+def cleanup(workdir):
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+__all__ = ["sim_config", "enabled", "install", "llm_endpoint", "prepare", "cleanup"] + hardware.__all__ + network.__all__ + llm.__all__
@@ -0,0 +1,323 @@
+import sys
+import time
+import types
+import threading
+import importlib.machinery
+from collections import deque
+
+
+class ActuationRecorder:
+    """
+    记录模拟硬件收到的输出操作.
+    每条记录包含时间、目标（如 "light"、"gpio:/dev/gpiochip0:70"、"serial:/dev/ttyS5"、"audio"）、操作与参数，
+    基准测试据此计算从触发到硬件动作的延迟。
+    """
+    def __init__(self, maxlen=4096):
+        self._records = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+
+    def record(self, target, action, value=None):
+        with self._cond:
+            self._records.append({"time": time.time(), "target": target, "action": action, "value": value})
+            self._cond.notify_all()
+
+    def since(self, start, prefix=""):
+        """ start 之后目标以 prefix 开头的记录 """
+        with self._cond:
+            return [record for record in self._records if record["time"] >= start and record["target"].startswith(prefix)]
+
+    def wait(self, start, prefix="", timeout=None):
+        """
+        等待 start 之后第一条目标以 prefix 开头的记录.
+        :return: 记录，超时返回 None
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while True:
+                for record in self._records:
+                    if record["time"] >= start and record["target"].startswith(prefix):
+                        return record
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def clear(self):
+        with self._cond:
+            self._records.clear()
+
+
+class Environment:
+    """
+    模拟的环境读数与硬件耗时，测试中可随时修改.
+    读数包括 co2、tvoc、light、temperature、humidity 与摄像头画面中的 person、fire 数量。
+    """
+    def __init__(self, latency=None):
+        self._lock = threading.Lock()
+        self._values = {
+            "co2": 420,
+            "tvoc": 5,
+            "light": 300.0,
+            "temperature": 25.0,
+            "humidity": 60.0,
+            "person": 0,
+            "fire": 0,
+        }
+        # 各环节的模拟耗时（秒）
+        self.latency = {"yolo": 0.05, "tts": 0.2, "i2c": 0.0}
+        if latency:
+            self.latency.update(latency)
+
+    def get(self, key):
+        with self._lock:
+            return self._values[key]
+
+    def set(self, **values):
+        with self._lock:
+            self._values.update(values)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+recorder = ActuationRecorder()
+environment = Environment()
+
+
+class GPIO:
+    """ periphery.GPIO，只在输出值变化时记录 """
+    def __init__(self, path, line, direction):
+        self._target = f"gpio:{path}:{line}"
+        self._direction = direction
+        self._value = False
+
+    def write(self, value):
+        value = bool(value)
+        if value != self._value:
+            self._value = value
+            recorder.record(self._target, "write", value)
+
+    def read(self):
+        return self._value
+
+    def close(self):
+        pass
+
+
+class Serial:
+    """ periphery.Serial """
+    def __init__(self, devpath, baudrate, **kwargs):
+        self._target = f"serial:{devpath}"
+        self.baudrate = baudrate
+
+    def write(self, data):
+        data = bytes(data)
+        recorder.record(self._target, "write", data.hex())
+        return len(data)
+
+    def read(self, length, timeout=None):
+        return b""
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SMBus:
+    """ smbus2.SMBus，按地址返回 SGP30、BH1750 与 AHT10 格式的读数 """
+    def __init__(self, bus=None):
+        self.bus = bus
+
+    def write_byte(self, addr, value):
+        pass
+
+    def write_i2c_block_data(self, addr, register, data):
+        pass
+
+    def read_i2c_block_data(self, addr, register, length):
+        if environment.latency["i2c"]:
+            time.sleep(environment.latency["i2c"])
+        values = environment.snapshot()
+        if addr == 0x58:
+            co2, tvoc = int(values["co2"]) & 0xFFFF, int(values["tvoc"]) & 0xFFFF
+            data = [co2 >> 8, co2 & 0xFF, 0, tvoc >> 8, tvoc & 0xFF, 0]
+        elif addr == 0x23:
+            raw = min(int(values["light"] * 1.2), 0xFFFF)
+            data = [raw >> 8, raw & 0xFF]
+        elif addr == 0x38:
+            humidity = int(values["humidity"] * 1048576 / 100) & 0xFFFFF
+            temperature = int((values["temperature"] + 50) * 1048576 / 200) & 0xFFFFF
+            data = [
+                0x1C,
+                humidity >> 12,
+                (humidity >> 4) & 0xFF,
+                ((humidity & 0x0F) << 4) | (temperature >> 16),
+                (temperature >> 8) & 0xFF,
+                temperature & 0xFF,
+            ]
+        else:
+            data = [0] * length
+        return (data + [0] * length)[:length]
+
+    def close(self):
+        pass
+
+
+class Light:
+    """ lightmodule.lightmodule.Light """
+    def __init__(self, red, green, blue):
+        self._pins = (red, green, blue)
+
+    def turn_on(self, red, green, blue):
+        recorder.record("light", "on", [red, green, blue])
+
+    def turn_off(self):
+        recorder.record("light", "off")
+
+
+class _Frame:
+    """ 摄像头画面，只携带拍摄时的 person 与 fire 数量 """
+    def __init__(self, person, fire):
+        self.person = person
+        self.fire = fire
+
+
+class VideoCapture:
+    """ cv2.VideoCapture """
+    def __init__(self, path, api=None):
+        self._opened = True
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self):
+        if not self._opened:
+            return False, None
+        return True, _Frame(environment.get("person"), environment.get("fire"))
+
+    def release(self):
+        self._opened = False
+
+
+class _Tensor(list):
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self
+
+
+class _Result:
+    def __init__(self, classes):
+        self.boxes = types.SimpleNamespace(cls=_Tensor(classes))
+
+
+class YOLO:
+    """ ultralytics.YOLO，按画面中的数量返回 person 与 fire 检测框 """
+    names = {0: "person", 1: "fire"}
+
+    def __init__(self, model=None, task=None):
+        self.model = model
+
+    def __call__(self, frame, **kwargs):
+        time.sleep(environment.latency["yolo"])
+        return [_Result([0] * frame.person + [1] * frame.fire)]
+
+
+class gTTS:
+    """ gtts.gTTS，写入的"音频"是文本本身 """
+    def __init__(self, text, lang="en", **kwargs):
+        self.text = text
+
+    def write_to_fp(self, fp):
+        time.sleep(environment.latency["tts"])
+        fp.write(self.text.encode("utf-8"))
+
+
+def _sf_read(file, **kwargs):
+    """ soundfile.read，每个字符对应 20 ms 的静音，最长 0.5 秒 """
+    samplerate = 8000
+    text = file.read().decode("utf-8", errors="ignore")
+    return [0.0] * int(min(len(text) * 0.02, 0.5) * samplerate), samplerate
+
+
+class _Stream:
+    def __init__(self):
+        self._until = 0.0
+
+    @property
+    def active(self):
+        return time.time() < self._until
+
+
+_stream = _Stream()
+
+
+def _sd_play(data, samplerate, **kwargs):
+    _stream._until = time.time() + len(data) / samplerate
+    recorder.record("audio", "play", len(data) / samplerate)
+
+
+def _sd_stop():
+    if _stream.active:
+        recorder.record("audio", "stop")
+    _stream._until = 0.0
+
+
+class _City:
+    def __init__(self):
+        self.location = types.SimpleNamespace(longitude=116.3975, latitude=39.9087)
+        self.city = types.SimpleNamespace(name="Sim City")
+
+
+class Reader:
+    """ geoip2.database.Reader，不读取数据库文件 """
+    def __init__(self, filename, **kwargs):
+        self.filename = filename
+
+    def city(self, ip):
+        return _City()
+
+    def close(self):
+        pass
+
+
+def _module(name, is_package=False, **attrs):
+    module = types.ModuleType(name)
+    # 带上 __spec__，importlib.util.find_spec 才能找到已注册的模块
+    module.__spec__ = importlib.machinery.ModuleSpec(name, None, is_package=is_package)
+    if is_package:
+        module.__path__ = []
+    module.__dict__.update(attrs)
+    return module
+
+
+def build_modules():
+    """ :return: {模块名: 模拟模块} """
+    modules = {
+        "periphery": _module("periphery", GPIO=GPIO, Serial=Serial),
+        "smbus2": _module("smbus2", SMBus=SMBus),
+        "cv2": _module("cv2", VideoCapture=VideoCapture, CAP_V4L2=200),
+        "ultralytics": _module("ultralytics", YOLO=YOLO),
+        "gtts": _module("gtts", gTTS=gTTS),
+        "soundfile": _module("soundfile", read=_sf_read),
+        "sounddevice": _module("sounddevice", play=_sd_play, stop=_sd_stop, get_stream=lambda: _stream),
+        "lightmodule": _module("lightmodule", is_package=True),
+        "lightmodule.lightmodule": _module("lightmodule.lightmodule", Light=Light),
+        "geoip2": _module("geoip2", is_package=True),
+        "geoip2.database": _module("geoip2.database", Reader=Reader),
+    }
+    modules["lightmodule"].lightmodule = modules["lightmodule.lightmodule"]
+    modules["geoip2"].database = modules["geoip2.database"]
+    return modules
+
+
+def install_hardware():
+    """ 用模拟模块替换硬件相关的库，已导入的真实模块也会被替换 """
+    sys.modules.update(build_modules())
+
+
+__all__ = ["ActuationRecorder", "Environment", "recorder", "environment", "build_modules", "install_hardware"]
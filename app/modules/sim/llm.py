@@ -0,0 +1,185 @@
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+def _devices(messages):
+    """ 从消息中的设备数据取出 {设备名: 设备} """
+    devices = {}
+    for message in messages:
+        if message.get("role") != "user":
+            continue
+        try:
+            content = json.loads(message.get("content") or "")
+        except (json.JSONDecodeError, TypeError):
+            continue
+        if not isinstance(content, dict) or content.get("action") == "trigger":
+            continue
+        for device in content.get("devices", []):
+            if "name" in device and "id" in device:
+                devices[device["name"]] = device
+    return devices
+
+
+def _trigger(messages):
+    for message in reversed(messages):
+        if message.get("role") != "user":
+            continue
+        try:
+            content = json.loads(message.get("content") or "")
+        except (json.JSONDecodeError, TypeError):
+            continue
+        if isinstance(content, dict) and content.get("action") == "trigger":
+            return content
+    return {"devices": []}
+
+
+# 触发消息中的关键字到动作的映射，按顺序匹配
+KEYWORDS = [
+    ("开灯", "rgb_light", {"status": "on", "color_rgb": [255, 200, 120]}),
+    ("关灯", "rgb_light", {"status": "off"}),
+    ("打开窗帘", "draperies", {"status": "open"}),
+    ("关闭窗帘", "draperies", {"status": "closed"}),
+    ("开门", "door", {"status": "open"}),
+    ("打开空调", "refrigeration", {"power": "on", "mode": "cool"}),
+    ("关闭空调", "refrigeration", {"power": "off"}),
+    ("Burning fire", "door", {"status": "open"}),
+    ("not at normal value", "refrigeration", {"power": "on"}),
+]
+
+
+def default_policy(messages):
+    """
+    模拟的决策：按触发消息中的关键字生成动作，并通过 notify 播报触发内容.
+    :return: 动作列表
+    """
+    devices = _devices(messages)
+    actions = []
+    for device in _trigger(messages).get("devices", []):
+        message = str(device.get("param", {}).get("present", {}).get("message", ""))
+        if message == "":
+            continue
+        for keyword, name, param in KEYWORDS:
+            if keyword in message and name in devices:
+                actions.append({"id": devices[name]["id"], "param": param})
+                break
+        if "notify" in devices:
+            actions.append({"id": devices["notify"]["id"], "param": {"message": message}})
+    return actions
+
+
+class MockLLMServer:
+    """
+    OpenAI 兼容的 /chat/completions 模拟服务，支持流式与非流式响应.
+    响应前等待 latency 秒模拟推理耗时，流式响应按 chunk_size 个字符分块发送。
+    每次请求的到达与完成时间记录在 requests 中。
+    """
+    def __init__(self, host="127.0.0.1", port=0, latency=0.3, chunk_size=16, policy=default_policy):
+        """
+        :param port: 监听端口，0 表示自动分配
+        :param latency: 首个 token 前的等待时间（秒）
+        :param policy: 接收消息列表、返回动作列表的函数
+        """
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.policy = policy
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="sim-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _record(self, entry):
+        with self._lock:
+            self.requests.append(entry)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                received = time.time()
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                messages = body.get("messages", [])
+                content = json.dumps({"actions": server.policy(messages)}, ensure_ascii=False)
+                prompt_tokens = sum(len(str(message.get("content", ""))) for message in messages) // 4
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4, "total_tokens": prompt_tokens + len(content) // 4}
+                time.sleep(server.latency)
+                if body.get("stream"):
+                    self._stream(content, usage, body)
+                else:
+                    self._complete(content, usage, body)
+                server._record({"received": received, "completed": time.time(), "stream": bool(body.get("stream")), "trigger": _trigger(messages), "content": content})
+
+            def _complete(self, content, usage, body):
+                out = json.dumps({
+                    "id": "sim", "object": "chat.completion", "created": int(time.time()), "model": body.get("model", "sim"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": usage,
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def _stream(self, content, usage, body):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                base = {"id": "sim", "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model", "sim")}
+                for i in range(0, len(content), server.chunk_size):
+                    delta = {"index": 0, "delta": {"content": content[i:i + server.chunk_size]}, "finish_reason": None}
+                    self._chunk(dict(base, choices=[delta]))
+                if body.get("stream_options", {}).get("include_usage"):
+                    self._chunk(dict(base, choices=[], usage=usage))
+                self._chunk("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, obj):
+                data = ("data: " + (obj if isinstance(obj, str) else json.dumps(obj)) + "\n\n").encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+        return Handler
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_llm(latency=0.3, port=0):
+    """ 启动全局共用的模拟服务，已启动时直接返回 """
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = MockLLMServer(port=port, latency=latency).start()
+        return _server
+
+
+def get_llm():
+    return _server
+
+
+__all__ = ["MockLLMServer", "default_policy", "start_llm", "get_llm"]
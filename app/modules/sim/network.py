@@ -0,0 +1,74 @@
+import json
+from io import BytesIO
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+# 模拟的公网 IP 与天气
+SIM_IP = "203.0.113.10"
+SIM_WEATHER = {
+    "skycon": "CLEAR_DAY",
+    "temperature": 26.0,
+    "apparent_temperature": 27.5,
+    "humidity": 0.55,
+    "wind": {"speed": 6.4, "direction": 90.0},
+}
+
+# 需要拦截的地址
+SIM_HOSTS = ("4.ipw.cn", "api.caiyunapp.com", "static.orii.top")
+
+
+class SimAdapter(BaseAdapter):
+    """
+    拦截设备驱动访问的外部服务.
+    4.ipw.cn 返回模拟 IP，彩云天气返回固定的实时天气；模型与数据库文件的下载返回 404，
+    运行模拟时应使用 sim.prepare 创建的工作目录，其中已放置占位文件。
+    """
+    def send(self, request, **kwargs):
+        host = urlparse(request.url).hostname
+        if host == "4.ipw.cn":
+            return self._response(request, 200, SIM_IP.encode("utf-8"), "text/plain")
+        if host == "api.caiyunapp.com" and request.url.endswith("/realtime"):
+            body = {"status": "ok", "result": {"realtime": SIM_WEATHER}}
+            return self._response(request, 200, json.dumps(body).encode("utf-8"), "application/json")
+        return self._response(request, 404, b"", "text/plain")
+
+    def _response(self, request, status, body, content_type):
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict({"Content-Type": content_type, "Content-Length": str(len(body))})
+        response.raw = BytesIO(body)
+        response.url = request.url
+        response.request = request
+        response.encoding = "utf-8"
+        return response
+
+    def close(self):
+        pass
+
+
+_installed = False
+
+
+def install_network():
+    """ 之后创建的每个 requests 会话都经由 SimAdapter 访问 SIM_HOSTS """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    init = requests.Session.__init__
+
+    def session_init(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        adapter = SimAdapter()
+        for host in SIM_HOSTS:
+            self.mount(f"http://{host}", adapter)
+            self.mount(f"https://{host}", adapter)
+
+    requests.Session.__init__ = session_init
+
+
+__all__ = ["SimAdapter", "install_network"]